@@ -0,0 +1,8 @@
+"""
+A benchmark suite for toml, which times each stage of loading and dumping
+documents produced by a set of reproducible generators.
+
+    $ python -m benchmarks run --output before.json
+    $ python -m benchmarks run --output after.json
+    $ python -m benchmarks compare before.json after.json
+"""
@@ -0,0 +1,64 @@
+import argparse
+import sys
+
+from . import suite
+from .generators import GENERATORS
+
+
+def _list(value):
+    return [item for item in value.split(",") if item]
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks")
+    commands = parser.add_subparsers(dest="command")
+    commands.required = True
+
+    run = commands.add_parser("run", help="run the benchmarks")
+    run.add_argument(
+        "--scenarios", type=_list, default=sorted(GENERATORS),
+        help="comma separated generators to run (default: all)",
+    )
+    run.add_argument(
+        "--sizes", type=lambda v: [int(s) for s in _list(v)],
+        default=[1000, 10000],
+        help="comma separated document sizes (default: 1000,10000)",
+    )
+    run.add_argument(
+        "--stages", type=_list, default=list(suite.STAGES),
+        help="comma separated stages to time (default: all)",
+    )
+    run.add_argument("--repeat", type=int, default=3)
+    run.add_argument("--output", help="save the results as JSON")
+
+    compare = commands.add_parser("compare", help="compare two saved runs")
+    compare.add_argument("old")
+    compare.add_argument("new")
+    compare.add_argument(
+        "--threshold", type=float, default=0.1,
+        help="relative slowdown that counts as a regression (default: 0.1)",
+    )
+
+    args = parser.parse_args(argv)
+
+    if args.command == "run":
+        unknown = (set(args.scenarios) - set(GENERATORS)) | (
+            set(args.stages) - set(suite.STAGES)
+        )
+        if unknown:
+            parser.error("unknown: {}".format(", ".join(sorted(unknown))))
+
+        results = suite.run(args.scenarios, args.sizes, args.stages,
+                            repeat=args.repeat)
+        if args.output:
+            suite.save(results, args.output)
+        return 0
+
+    regressions = suite.compare(
+        suite.load(args.old), suite.load(args.new), args.threshold,
+    )
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,67 @@
+"""
+Show how long loading a large document blocks the event loop for, by timing
+how late a ticker that wants to run every millisecond ends up running, while
+the document is loaded with loads(), and with aloads() in an executor and
+cooperatively.
+
+    $ python -m benchmarks.bench_async [size]
+"""
+import asyncio
+import sys
+import time
+
+import toml
+
+from benchmarks.generators import wide_table
+
+
+async def _ticker(lags, interval=0.001):
+    clock = time.perf_counter
+    while True:
+        start = clock()
+        await asyncio.sleep(interval)
+        lags.append(clock() - start - interval)
+
+
+async def _measure(load):
+    lags = []
+    ticker = asyncio.ensure_future(_ticker(lags))
+    await asyncio.sleep(0.01)
+
+    start = time.perf_counter()
+    await load()
+    elapsed = time.perf_counter() - start
+
+    # Give the ticker a chance to notice how late it is before stopping it.
+    await asyncio.sleep(0.01)
+    ticker.cancel()
+    return elapsed, max(lags), sum(lags) / len(lags)
+
+
+def main(argv):
+    size = int(argv[0]) if argv else 60000
+    document, = wide_table(size)
+
+    async def blocking():
+        toml.loads(document)
+
+    modes = [("loads", blocking), ("executor", lambda: toml.aloads(document))]
+    for yield_every in (100, 1000, 10000):
+        modes.append((
+            "yield_every={}".format(yield_every),
+            lambda n=yield_every: toml.aloads(document, yield_every=n),
+        ))
+
+    print("{:,} bytes".format(len(document)))
+    print("{:<20} {:>10} {:>12} {:>12}".format(
+        "", "total", "max lag", "mean lag",
+    ))
+    for label, load in modes:
+        elapsed, worst, mean = asyncio.run(_measure(load))
+        print("{:<20} {:>9.3f}s {:>10.2f}ms {:>10.2f}ms".format(
+            label, elapsed, worst * 1e3, mean * 1e3,
+        ))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
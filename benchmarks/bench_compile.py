@@ -0,0 +1,52 @@
+"""
+Show how the time it takes to compile a document scales with the number of
+keys in it, which should be linear.
+
+    $ python -m benchmarks.bench_compile [max keys]
+"""
+import sys
+import time
+
+from toml import _nodes
+
+
+def _document(keys, per_table=1000):
+    # Build the FST directly rather than parsing it, so that we're only
+    # measuring compile().
+    root = table = _nodes.Document()
+    for i in range(keys):
+        if not i % per_table:
+            table = _nodes.Table()
+            table.parent = root
+            table_name = _nodes.TableName()
+            table_name.parent = table
+            _nodes.OpenBracket(content="[").parent = table_name
+            _nodes.BareKey(content="t{}".format(i)).parent = table_name
+            _nodes.CloseBracket(content="]").parent = table_name
+
+        stmt = _nodes.ValueStatement()
+        stmt.parent = table
+        _nodes.BareKey(content="k{}".format(i)).parent = stmt
+        _nodes.Assignment(content="=").parent = stmt
+        _nodes.Integer(content=str(i)).parent = stmt
+    return root
+
+
+def main(argv):
+    max_keys = int(argv[0]) if argv else 10 ** 6
+
+    keys = 1000
+    while keys <= max_keys:
+        document = _document(keys)
+        start = time.perf_counter()
+        document.compile()
+        elapsed = time.perf_counter() - start
+        print("{:>10,} keys: {:>8.3f}s {:>8.3f}us/key".format(
+            keys, elapsed, elapsed / keys * 1e6,
+        ))
+        del document
+        keys *= 10
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
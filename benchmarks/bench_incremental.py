@@ -0,0 +1,72 @@
+"""
+Compare the latency of reparsing a document after a single small edit, and of
+re-rendering it after setting a single value, against loading or rendering the
+entire document again. Both should stay flat as the document grows, other
+than the cost of copying the document's text.
+
+    $ python -m benchmarks.bench_incremental
+"""
+import timeit
+
+import toml
+
+from benchmarks.generators import dotted_tables
+
+
+def main():
+    for tables in [10, 100, 1000, 10000]:
+        data, = dotted_tables(tables)
+        document = toml.parse(data)
+        document.compile()
+
+        # Flip the last digit of the value of the table in the middle of the
+        # document back and forth.
+        middle = str(tables // 2)
+        offset = data.index("value = {}\n".format(middle))
+        name = data[data.rindex("[", 0, offset) + 1:offset - 2].split(".")
+        offset += len("value = ") + len(middle) - 1
+        values = ["1" if middle[-1] != "1" else "2", middle[-1]]
+
+        def edit():
+            value = values.pop(0)
+            values.append(value)
+            document.edit(offset, 1, value)
+
+        def edit_and_compile():
+            edit()
+            document.compile()
+
+        def set_value():
+            value = values.pop(0)
+            values.append(value)
+            document.set(tuple(name) + ("value",), int(middle[:-1] + value))
+
+        def render():
+            # Render the entire tree again, ignoring what it has cached.
+            stack = [document.document]
+            while stack:
+                node = stack.pop()
+                if node.children:
+                    node._rendered = None
+                    stack.extend(node.children)
+            document.document.render()
+
+        number = 20
+        full = min(timeit.repeat(lambda: toml.loads(data), number=1, repeat=3))
+        edited = min(timeit.repeat(edit, number=number, repeat=3)) / number
+        compiled = min(
+            timeit.repeat(edit_and_compile, number=number, repeat=3)
+        ) / number
+        rendered = min(timeit.repeat(render, number=1, repeat=3))
+        set_ = min(timeit.repeat(set_value, number=number, repeat=3)) / number
+
+        print("{:>9,} bytes: loads {:>9.3f}ms edit {:>7.3f}ms "
+              "edit+compile {:>8.3f}ms render {:>8.3f}ms set {:>7.3f}ms"
+              .format(
+                  len(data), full * 1e3, edited * 1e3, compiled * 1e3,
+                  rendered * 1e3, set_ * 1e3,
+              ))
+
+
+if __name__ == "__main__":
+    main()
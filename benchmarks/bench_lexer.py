@@ -0,0 +1,48 @@
+"""
+Compare the throughput of toml's lexer against a generic rply lexer built from
+the very same rules, on the documents from each of the benchmark suite's
+generators.
+
+    $ python -m benchmarks.bench_lexer [size]
+"""
+import sys
+import timeit
+
+import rply
+
+from toml import _lexer
+
+from benchmarks.generators import GENERATORS
+
+
+def _rply_lexer():
+    lg = rply.LexerGenerator()
+    for name, pattern in _lexer._rules:
+        lg.add(name, pattern)
+    return lg.build()
+
+
+def main(argv):
+    size = int(argv[0]) if argv else 40000
+    old = _rply_lexer()
+
+    for generator, (fn, _) in sorted(GENERATORS.items()):
+        documents = fn(size)
+        length = sum(len(data) for data in documents)
+        tokens = sum(
+            sum(1 for _ in _lexer.lex(data)) for data in documents
+        )
+        print("{}: {:,} bytes, {:,} tokens".format(generator, length, tokens))
+
+        for name, lex in [("rply", old.lex), ("toml", _lexer.lex)]:
+            best = min(timeit.repeat(
+                lambda: [list(lex(data)) for data in documents],
+                number=1, repeat=5,
+            ))
+            print("{:>7}: {:.3f}s {:>12,.0f} tokens/s {:>8.2f} MB/s".format(
+                name, best, tokens / best, length / best / 1e6,
+            ))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,93 @@
+"""
+Compare the memory used by toml's FST against the same tree built out of
+anytree.NodeMixin nodes, which is how the FST used to be represented, for the
+documents from each of the benchmark suite's generators that can be parsed.
+
+    $ python -m benchmarks.bench_nodes_memory [size]
+"""
+import gc
+import sys
+import tracemalloc
+
+from toml import _lexer, _nodes, _parser
+
+from benchmarks.generators import GENERATORS
+
+try:
+    import anytree
+except ImportError:
+    anytree = None
+
+
+if anytree is not None:
+    class AnytreeNode(anytree.NodeMixin):
+
+        def __init__(self, content=None):
+            self.content = content
+
+
+def _copy(node, factory):
+    # Copy the tree using the given node factory, reusing the content strings
+    # of the original tree so that we're only measuring the nodes themselves.
+    if isinstance(node, _nodes.ContentNode):
+        new = factory(node.__class__, node.content)
+    else:
+        new = factory(node.__class__, None)
+        for child in node.children:
+            _copy(child, factory).parent = new
+    return new
+
+
+def _slotted(cls, content):
+    return cls() if content is None else cls(content=content)
+
+
+def _anytree(cls, content):
+    return AnytreeNode(content=content)
+
+
+def _measure(fst, factory):
+    gc.collect()
+    tracemalloc.start()
+    try:
+        copy = _copy(fst, factory)
+        size, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del copy
+    return size
+
+
+def main(argv):
+    size = int(argv[0]) if argv else 40000
+    if anytree is None:
+        print("anytree is not installed, skipping comparison")
+
+    for generator, (fn, parses) in sorted(GENERATORS.items()):
+        if not parses:
+            continue
+
+        documents = fn(size)
+        length = sum(len(data) for data in documents)
+        fsts = [_parser.parse(_lexer.lex(data)) for data in documents]
+
+        nodes, stack = 0, list(fsts)
+        while stack:
+            node = stack.pop()
+            nodes += 1
+            stack.extend(node.children)
+
+        print("{}: {:,} bytes, {:,} nodes".format(generator, length, nodes))
+
+        factories = [("slots", _slotted)]
+        if anytree is not None:
+            factories.append(("anytree", _anytree))
+
+        for name, factory in factories:
+            used = sum(_measure(fst, factory) for fst in fsts)
+            print("{:>10}: {:>12,} bytes {:>6.1f} bytes/node {:>5.1f}x source"
+                  .format(name, used, used / nodes, used / length))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
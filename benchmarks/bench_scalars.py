@@ -0,0 +1,111 @@
+"""
+Compare decoding datetimes, basic strings and keys against how they used to
+be decoded, with strptime, by slicing, and without interning keys.
+
+    $ python -m benchmarks.bench_scalars [count]
+"""
+import datetime
+import sys
+import time
+
+import toml
+from toml import _nodes
+
+
+def _strptime(content):
+    if content.endswith("Z"):
+        return datetime.datetime.strptime(content, "%Y-%m-%dT%H:%M:%SZ")
+    content = content[:-3] + content[-2:]
+    return datetime.datetime.strptime(content, "%Y-%m-%dT%H:%M:%S%z")
+
+
+def _slice(content):
+    return content[1:-1]
+
+
+def _time(fn, values):
+    start = time.perf_counter()
+    for value in values:
+        fn(value)
+    return time.perf_counter() - start
+
+
+def _compare(label, old, new, values):
+    old_elapsed, new_elapsed = _time(old, values), _time(new, values)
+    print("{:<24} {:>8.3f}us {:>8.3f}us {:>6.1f}x".format(
+        label,
+        old_elapsed / len(values) * 1e6,
+        new_elapsed / len(values) * 1e6,
+        old_elapsed / new_elapsed,
+    ))
+
+
+def _keys(count):
+    # A document of logs, where every table repeats the same handful of keys.
+    lines = []
+    for i in range(count):
+        lines.append("[log{}]".format(i))
+        for key in ("level", "message", "source", "version"):
+            lines.append('{} = "x"'.format(key))
+    return "\n".join(lines) + "\n"
+
+
+def _key_bytes(data, seen):
+    # The bytes taken up by every key in data, counting each distinct string
+    # object only once, like keys that have been interned.
+    total = 0
+    for key, value in data.items():
+        if id(key) not in seen:
+            seen.add(id(key))
+            total += sys.getsizeof(key)
+        if isinstance(value, dict):
+            total += _key_bytes(value, seen)
+    return total
+
+
+class _Unique(object):
+    # A set that never contains anything, so that every key gets counted, like
+    # keys that haven't been interned.
+
+    def __contains__(self, item):
+        return False
+
+    def add(self, item):
+        pass
+
+
+def main(argv):
+    count = int(argv[0]) if argv else 100000
+
+    print("{:<24} {:>10} {:>10} {:>7}".format("", "old", "new", ""))
+    _compare(
+        "datetime (Z)", _strptime, _nodes.OffsetDateTime.decode,
+        ["1979-05-27T07:32:{:02d}Z".format(i % 60) for i in range(count)],
+    )
+    _compare(
+        "datetime (offset)", _strptime, _nodes.OffsetDateTime.decode,
+        [
+            "1979-05-27T07:32:{:02d}-07:00".format(i % 60)
+            for i in range(count)
+        ],
+    )
+    _compare(
+        "string (no escapes)", _slice, _nodes.BasicString.decode,
+        ['"a plain old string {}"'.format(i) for i in range(count)],
+    )
+    # Slicing doesn't decode escapes at all, this is just to show what they
+    # cost compared to a string without them.
+    _compare(
+        "string (escapes)", _slice, _nodes.BasicString.decode,
+        ['"a\\tstring\\nwith \\u00e9scapes {}"'.format(i)
+         for i in range(count)],
+    )
+
+    data = toml.loads(_keys(count // 10))
+    print("{:<24} {:>9,}B {:>9,}B".format(
+        "keys (memory)", _key_bytes(data, _Unique()), _key_bytes(data, set()),
+    ))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,108 @@
+"""
+Reproducible generators of synthetic TOML documents for the benchmark suite.
+
+Each generator takes a size, roughly the number of values in the document, and
+returns a list of documents. The same size always produces exactly the same
+documents, so results can be compared between commits.
+"""
+
+
+def wide_table(size):
+    """
+    A single table with a very large number of keys of mixed types.
+    """
+    lines = ["[wide]"]
+    for i in range(size):
+        kind = i % 4
+        if kind == 0:
+            lines.append('key{} = "value {}"  # a comment'.format(i, i))
+        elif kind == 1:
+            lines.append("key{} = {}".format(i, i * 7919))
+        elif kind == 2:
+            lines.append("key{} = {}".format(i, "true" if i % 8 else "false"))
+        else:
+            lines.append("key{} = 1979-05-27T07:32:00Z".format(i))
+    return ["\n".join(lines) + "\n"]
+
+
+def dotted_tables(size, depth=8):
+    """
+    Many tables with deeply dotted names, each holding a single key.
+    """
+    lines = []
+    for i in range(size):
+        name = ".".join(
+            "level{}_{}".format(d, (i >> d) % 4) for d in range(depth - 1)
+        )
+        lines.append("[{}.t{}]".format(name, i))
+        lines.append("value = {}".format(i))
+        lines.append("")
+    return ["\n".join(lines) + "\n"]
+
+
+def long_arrays(size, width=1000):
+    """
+    Long arrays of integers, with the odd nested array of strings mixed in.
+    """
+    lines = []
+    for i in range(max(1, size // width)):
+        values = ", ".join(str(j) for j in range(width))
+        lines.append("ints{} = [ {} ]".format(i, values))
+        lines.append('nested{} = [ [ "a", "b" ], [ "c" ], [] ]'.format(i))
+    return ["\n".join(lines) + "\n"]
+
+
+def long_strings(size, length=4096):
+    """
+    Keys whose values are very long basic strings, with escapes.
+    """
+    chunk = "lorem ipsum \\t dolor sit amet \\u00e9 "
+    value = (chunk * (length // len(chunk) + 1))[:length]
+    # Make sure we haven't cut an escape in half.
+    value = value[:value.rfind(" ")]
+    lines = ['s{} = "{}"'.format(i, value) for i in range(max(1, size // 10))]
+    return ["\n".join(lines) + "\n"]
+
+
+def multiline_strings(size, length=64 * 1024):
+    """
+    Very large multiline strings. The parser does not support multiline
+    strings yet, so these can only be lexed.
+    """
+    body = "\n".join(
+        "line {} of a much larger multiline string".format(i)
+        for i in range(length // 40)
+    )
+    lines = [
+        'm{} = """\n{}"""'.format(i, body) for i in range(max(1, size // 100))
+    ]
+    return ["\n".join(lines) + "\n"]
+
+
+def many_small_files(size):
+    """
+    A large number of small documents, the kind of thing that comes from
+    loading lots of little configuration files, where per call overhead
+    dominates.
+    """
+    documents = []
+    for i in range(max(1, size // 10)):
+        documents.append(
+            '# config {}\nname = "file{}"\nversion = {}\n\n'
+            '[build]\nenabled = true\ntargets = [ "a", "b" ]\n\n'
+            '[owner]\nname = "someone"\n'
+            "created = 1979-05-27T07:32:00-08:00\n".format(i, i, i)
+        )
+    return documents
+
+
+# The name of each generator, along with whether the documents it produces can
+# be parsed, or only lexed.
+GENERATORS = {
+    "wide_table": (wide_table, True),
+    "dotted_tables": (dotted_tables, True),
+    "long_arrays": (long_arrays, True),
+    "long_strings": (long_strings, True),
+    "multiline_strings": (multiline_strings, False),
+    "many_small_files": (many_small_files, True),
+}
@@ -0,0 +1,262 @@
+"""
+Times each stage of loading and dumping TOML separately, across each of our
+document generators and a range of sizes, and compares saved results.
+"""
+import datetime
+import gc
+import json
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import toml
+from toml import _lexer, _parser
+
+from .generators import GENERATORS
+
+
+def _tokens(documents):
+    return [list(_lexer.lex(document)) for document in documents]
+
+
+# Each stage is a pair of functions, the first prepares whatever the stage
+# needs from the documents (outside of the timing), and the second is the
+# thing that is actually timed. Splitting things up this way lets us time each
+# stage on its own, for instance parsing from tokens that were already lexed.
+def _lex(prepared):
+    for document in prepared:
+        for _ in _lexer.lex(document):
+            pass
+
+
+def _parse(prepared):
+    for tokens in prepared:
+        _parser.parse(tokens)
+
+
+def _compile(prepared):
+    for document in prepared:
+        document.compile()
+
+
+def _render(prepared):
+    for document in prepared:
+        document.render()
+
+
+def _loads(prepared):
+    for document in prepared:
+        toml.loads(document)
+
+
+def _arrays(prepared):
+    for document in prepared:
+        toml.loads(document, array_type="array")
+
+
+def _locations(prepared):
+    for document in prepared:
+        toml.loads_with_locations(document)
+
+
+def _validate(prepared):
+    for document in prepared:
+        toml.validate(document)
+
+
+def _dumps(prepared):
+    for data in prepared:
+        toml.dumps(data)
+
+
+def _dump(prepared):
+    for data in prepared:
+        toml.dump(data, _Discard())
+
+
+class _Discard(object):
+    # A file that throws away everything written to it, so that we only time
+    # serializing the data.
+
+    def write(self, data):
+        pass
+
+
+def _data(documents):
+    return [toml.loads(document) for document in documents]
+
+
+def _fsts(documents):
+    return [_parser.parse(tokens) for tokens in _tokens(documents)]
+
+
+STAGES = {
+    "lex": (list, _lex),
+    "parse": (_tokens, _parse),
+    "compile": (_fsts, _compile),
+    "render": (_fsts, _render),
+    "loads": (list, _loads),
+    "arrays": (list, _arrays),
+    "locations": (list, _locations),
+    "validate": (list, _validate),
+    "dumps": (_data, _dumps),
+    "dump": (_data, _dump),
+}
+
+# Stages that only need the lexer, everything else needs to be able to parse
+# the document.
+LEX_STAGES = {"lex"}
+
+
+def _best(prepare, fn, documents, repeat):
+    # Each run gets freshly prepared input, since some stages cache their
+    # results (such as rendering) and would otherwise only be timed once.
+    times = []
+    for _ in range(repeat):
+        prepared = prepare(documents)
+        gc.collect()
+        start = time.perf_counter()
+        fn(prepared)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def _peak(prepare, fn, documents):
+    # Tracing allocations slows everything down considerably, so we measure
+    # memory on a separate run from the one that we time.
+    prepared = prepare(documents)
+    gc.collect()
+    tracemalloc.start()
+    try:
+        fn(prepared)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak
+
+
+def run_one(name, size, stage, repeat=3):
+    generator, parses = GENERATORS[name]
+    documents = generator(size)
+    nbytes = sum(len(d.encode("utf8")) for d in documents)
+    ntokens = sum(sum(1 for _ in _lexer.lex(d)) for d in documents)
+
+    result = {
+        "scenario": name,
+        "size": size,
+        "stage": stage,
+        "documents": len(documents),
+        "bytes": nbytes,
+        "tokens": ntokens,
+    }
+
+    if not parses and stage not in LEX_STAGES:
+        result["error"] = "unsupported"
+        return result
+
+    prepare, fn = STAGES[stage]
+    try:
+        seconds = _best(prepare, fn, documents, repeat)
+        peak = _peak(prepare, fn, documents)
+    except Exception as exc:
+        # A stage that can't handle a document (dumps doesn't support every
+        # type yet) is reported, rather than stopping the entire run.
+        result["error"] = "{}: {}".format(type(exc).__name__, exc)
+        return result
+
+    result.update({
+        "seconds": seconds,
+        "mb_per_s": nbytes / seconds / 1e6,
+        "tokens_per_s": ntokens / seconds,
+        "peak_bytes": peak,
+    })
+    return result
+
+
+def _commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "HEAD"], stderr=subprocess.DEVNULL,
+        ).decode("ascii").strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(scenarios, sizes, stages, repeat=3, out=sys.stdout):
+    results = []
+    for name in scenarios:
+        for size in sizes:
+            for stage in stages:
+                result = run_one(name, size, stage, repeat)
+                results.append(result)
+                out.write(format_result(result) + "\n")
+                out.flush()
+
+    return {
+        "meta": {
+            "commit": _commit(),
+            "date": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "python": sys.version,
+            "implementation": platform.python_implementation(),
+            "platform": platform.platform(),
+            "repeat": repeat,
+        },
+        "results": results,
+    }
+
+
+def format_result(result):
+    prefix = "{:<18} {:>8,} {:<8}".format(
+        result["scenario"], result["size"], result["stage"],
+    )
+    if "error" in result:
+        return "{} {}".format(prefix, result["error"])
+    return (
+        "{} {:>9.4f}s {:>8.2f} MB/s {:>12,.0f} tokens/s {:>12,} B peak".format(
+            prefix, result["seconds"], result["mb_per_s"],
+            result["tokens_per_s"], result["peak_bytes"],
+        )
+    )
+
+
+def compare(old, new, threshold=0.1, out=sys.stdout):
+    # Compare two saved runs, matching results up by scenario, size and stage,
+    # and return how many of them got slower by more than the threshold.
+    def key(result):
+        return result["scenario"], result["size"], result["stage"]
+
+    before = {key(r): r for r in old["results"] if "error" not in r}
+    regressions = 0
+    for result in new["results"]:
+        previous = before.get(key(result))
+        if previous is None or "error" in result:
+            continue
+
+        ratio = result["seconds"] / previous["seconds"]
+        memory = result["peak_bytes"] / max(previous["peak_bytes"], 1)
+        flag = ""
+        if ratio > 1 + threshold:
+            flag = "  SLOWER"
+            regressions += 1
+        elif ratio < 1 - threshold:
+            flag = "  faster"
+
+        out.write("{:<18} {:>8,} {:<8} {:>9.4f}s -> {:>9.4f}s {:>6.2f}x time "
+                  "{:>6.2f}x memory{}\n".format(
+                      result["scenario"], result["size"], result["stage"],
+                      previous["seconds"], result["seconds"], ratio, memory,
+                      flag,
+                  ))
+    return regressions
+
+
+def save(results, path):
+    with open(path, "w") as fp:
+        json.dump(results, fp, indent=2, sort_keys=True)
+
+
+def load(path):
+    with open(path) as fp:
+        return json.load(fp)
@@ -1,33 +1,282 @@
+import codecs
 import collections
-import datetime
-import re
+import io
+import time
 
+import rply
 import six
 
-from . import _lexer, _parser, _nodes
+from . import _digests, _encoder, _instrument, _lazy, _lexer, _parser, _select
+from ._bulk import LoadResult, load_many  # noqa
+from ._encoder import iterdump, register_encoder  # noqa
+from ._cache import ParseCache
+from ._digests import TableDiff  # noqa
+from ._incremental import ParsedDocument
+from ._instrument import Stats, instrument  # noqa
+from ._utils import Location  # noqa
 
 
-def loads(data):
-    if not isinstance(data, six.string_types):
-        # TOML documents are *always* UTF8 encoded, so if somebody hands us
-        # some bytes, then we can decode them as UTF8 before going any further.
-        data = data.decode("utf8")
+def __getattr__(name):
+    # Importing asyncio takes longer than importing the rest of toml does, so
+    # the async entry points are only imported the first time they're used.
+    if name in ("aload", "aloads"):
+        from . import _async
+        return getattr(_async, name)
+    raise AttributeError(
+        "module {!r} has no attribute {!r}".format(__name__, name)
+    )
+
+
+def load(fp):
+    # Rather than reading the entire file into memory up front, we lex it
+    # incrementally as the parser asks for more tokens, so we only ever hold
+    # onto a small chunk of the file along with the values we've compiled.
+    stats = _instrument.active()
+    if stats is not None:
+        fp = _instrument.CountingReader(fp, stats)
+        return stats.parse(_lexer.lex_file(fp), _parser.ValueState())
+    return _parser.parse(_lexer.lex_file(fp), _parser.ValueState())
+
+
+_parse_cache = ParseCache()
+
+
+def load_cached(path):
+    # Loads the file at the given path, reusing the result from the last time
+    # it was loaded as long as the file hasn't changed since then. Since the
+    # same result is shared between every caller, it is read only, tables are
+    # returned as mapping proxies and arrays are returned as tuples.
+    return _parse_cache.load(path)
+
+
+# Mirror the interface of functools.lru_cache, which people will already be
+# familiar with.
+load_cached.cache_info = _parse_cache.info
+load_cached.cache_clear = _parse_cache.clear
+
+
+def loads(data, lazy=False, only=None, array_type=None):
+    if lazy and only is not None:
+        raise ValueError("Cannot use only when loading lazily.")
+    if lazy and array_type is not None:
+        raise ValueError("Cannot use array_type when loading lazily.")
 
-    # Generate a FST for our given TOML document, at this point the document
-    # will be entirely parsed and can be compiled to return our values.
-    toml = _parser.parse(_lexer.lex(data))
+    stats = _instrument.active()
+    if stats is not None:
+        stats.bytes_in += len(
+            data.encode("utf8") if isinstance(data, six.text_type) else data
+        )
 
-    # TODO: There should be an intermediate state between what toml.compile()
+    # TOML documents are *always* UTF8 encoded, so if somebody hands us some
+    # bytes (or a bytearray, memoryview, mmap, etc) then we can lex them as is,
+    # decoding each token as we go. Loading lazily or selectively means
+    # searching the document for table headers first though, which we only
+    # know how to do once it has been decoded.
+    binary = not isinstance(data, six.string_types)
+    if binary and (lazy or only is not None):
+        data = str(data, "utf8")
+
+    # When loading lazily, we only find where each of the tables in the
+    # document are up front, and return a read only mapping that will only
+    # parse and compile each table the first time it is accessed.
+    if lazy:
+        if stats is not None:
+            stats.calls += 1
+            with stats.timed("scan"):
+                return _lazy.load(data)
+        return _lazy.load(data)
+
+    # When only some parts of the document are wanted, we can skip parsing
+    # any of the tables that couldn't have those parts in them.
+    if only is not None:
+        if stats is not None:
+            stats.calls += 1
+            return _select.load(data, only, array_type, stats)
+        return _select.load(data, only, array_type)
+
+    # We don't need to hold onto any of the formatting information from the
+    # document here, so rather than generating a FST and then compiling it, we
+    # compile the values directly as the document is being parsed.
+    # TODO: There should be an intermediate state between what the parser
     #       returns and the "plain" Python data types that we want to return.
-    #       This intermediate state will hold references to what FST nodes
-    #       caused which piece of data to be added. While this wouldn't
-    #       actually be used in loads(), it would change this line to need to
-    #       call some additional funtion to throw that all away.
-    output = toml.compile()
+    #       This intermediate state will hold references to what part of the
+    #       document caused which piece of data to be added.
+    #
+    # Arrays of integers can be lexed as a single token and converted all at
+    # once, into an array.array or a NumPy array, rather than as a list with a
+    # Python int for every element.
+    state = _parser.ValueState(array_type)
+    lex = _lexer.lex_bytes if binary else _lexer.lex
+    tokens = lex(data, integer_arrays=array_type is not None)
+    if stats is not None:
+        return stats.parse(tokens, state)
+    return _parser.parse(tokens, state)
+
+
+def parse(data):
+    # Parses a document into a ParsedDocument, which holds onto the full
+    # structure of the document so that it can be edited and compiled again
+    # without having to start over from scratch each time.
+    if not isinstance(data, six.string_types):
+        data = str(data, "utf8")
+    stats = _instrument.active()
+    if stats is not None:
+        stats.bytes_in += len(data.encode("utf8"))
+    return ParsedDocument(data)
 
-    # Now that we've lexed, parsed, and compiled our TOML document, we're done
-    # and we can return it to our caller.
-    return output
+
+def loads_with_locations(data):
+    # Like loads(), but also returns an index of where each key and table was
+    # defined in the document, mapping the path to that key or table (a tuple
+    # of the names of the tables it is within, followed by its own name) to
+    # the Location of its definition. Tables that were only ever implicitly
+    # defined don't have a location.
+    if not isinstance(data, six.string_types):
+        data = str(data, "utf8")
+    return _parser.parse(_lexer.lex(data), _parser.LocationState())
+
+
+def table_digests(data):
+    # Returns a digest of the source of each table in the document, keyed by
+    # the name of the table, without parsing the document.
+    if not isinstance(data, six.string_types):
+        data = str(data, "utf8")
+    return _digests.table_digests(data)
+
+
+def diff_tables(old, new):
+    # Figures out which tables were added, removed, or changed between two
+    # versions of a document. Either version can be given as the document
+    # itself or as its table_digests(), so when a document is reloaded over
+    # and over again, only the digests of the last version need to be kept.
+    # Only the tables that changed then need to be loaded again, for
+    # instance with loads(new, only=...).
+    if not isinstance(old, dict):
+        old = table_digests(old)
+    if not isinstance(new, dict):
+        new = table_digests(new)
+    return _digests.diff_tables(old, new)
+
+
+ValidationError = collections.namedtuple(
+    "ValidationError", ["message", "line", "column", "offset"],
+)
+
+
+def validate(data):
+    # Checks whether a document is syntactically valid TOML, without building
+    # or compiling anything, returning None if it is, or a ValidationError
+    # describing the first problem in the document if it isn't. Note that this
+    # does not catch semantic errors, such as a key being defined twice.
+    #
+    # Bytes (or a bytearray, memoryview, mmap, etc) are lexed as is, decoding
+    # each token as we go, so that we never need a decoded copy of the entire
+    # document.
+    if isinstance(data, six.string_types):
+        lex, match, error = _lexer.lex, _lexer._match, _validation_error
+    else:
+        lex, match = _lexer.lex_bytes, _lexer._byte_match
+        error = _binary_validation_error
+
+    try:
+        _parser.validate(lex(data))
+    except UnicodeDecodeError as exc:
+        return error(data, exc.start, "Invalid UTF8: {}".format(exc.reason))
+    except rply.LexingError as exc:
+        idx = exc.getsourcepos().idx
+        try:
+            char = _character_at(data, idx)
+        except UnicodeDecodeError as exc:
+            return error(data, idx, "Invalid UTF8: {}".format(exc.reason))
+        return error(data, idx, "Unexpected character {!r}".format(char))
+    except rply.ParsingError as exc:
+        pos = exc.getsourcepos()
+
+        # The parser doesn't tell us what token it choked on, but we know
+        # where that token starts so we can just lex it again. If there isn't
+        # a position, then we ran out of tokens before the document was done.
+        if pos is None:
+            return error(data, len(data), "Unexpected end of document")
+        name, value = match(data, pos.idx, len(data))
+        return error(data, pos.idx, "Unexpected {} {!r}".format(name, value))
+
+
+def _character_at(data, idx):
+    # Returns the character that starts at the given offset, which for bytes
+    # means decoding however many bytes make up that one character.
+    if isinstance(data, six.string_types):
+        return data[idx]
+    decoder = codecs.getincrementaldecoder("utf8")()
+    for i in range(idx, min(idx + 4, len(data))):
+        char = decoder.decode(data[i:i + 1])
+        if char:
+            return char
+    return decoder.decode(b"", final=True)
+
+
+def _validation_error(data, offset, message):
+    line_start = data.rfind("\n", 0, offset) + 1
+    return ValidationError(
+        message, data.count("\n", 0, offset) + 1, offset - line_start + 1,
+        offset,
+    )
+
+
+def _binary_validation_error(data, pos, message, chunk_size=64 * 1024):
+    # Our offsets are always in characters, so we count how many characters
+    # (and lines) there are before the given offset in bytes, decoding a chunk
+    # at a time. Everything before it has already been lexed, so we know that
+    # it's valid UTF8.
+    decoder = codecs.getincrementaldecoder("utf8")()
+    offset, line, column = 0, 1, 1
+    for i in range(0, pos, chunk_size):
+        text = decoder.decode(data[i:min(pos, i + chunk_size)])
+        newlines = text.count("\n")
+        if newlines:
+            line += newlines
+            column = len(text) - text.rfind("\n")
+        else:
+            column += len(text)
+        offset += len(text)
+    return ValidationError(message, line, column, offset)
+
+
+def _is_binary(fp):
+    # Not every text file subclasses io.TextIOBase (SpooledTemporaryFile and
+    # codecs' StreamWriters don't, for instance), so a file is only treated as
+    # binary if it's obviously binary. StreamWriters pass the mode of the file
+    # that they wrap through, so they need to be checked first.
+    if isinstance(fp, (io.TextIOBase, codecs.StreamWriter)):
+        return False
+    if isinstance(fp, (io.RawIOBase, io.BufferedIOBase)):
+        return True
+    mode = getattr(fp, "mode", "")
+    return isinstance(mode, str) and "b" in mode
+
+
+def dump(data, fp, buffer_size=64 * 1024):
+    # Writes our data to a file object a chunk at a time, rather than building
+    # the entire document in memory first. Files that are opened in binary
+    # mode get written UTF8 bytes, anything else gets written text. If our
+    # data can't be serialized, then everything that came before the problem
+    # will already have been written.
+    stats = _instrument.active()
+    if stats is not None:
+        start = time.perf_counter()
+
+    binary = _is_binary(fp)
+    for chunk in _encoder.batched(iterdump(data), buffer_size):
+        if binary:
+            chunk = chunk.encode("utf8")
+            if stats is not None:
+                stats.bytes_out += len(chunk)
+        elif stats is not None:
+            stats.bytes_out += len(chunk.encode("utf8"))
+        fp.write(chunk)
+
+    if stats is not None:
+        stats.calls += 1
+        stats.times["dump"] += time.perf_counter() - start
 
 
 def dumps(data):
@@ -35,99 +284,7 @@ def dumps(data):
     #       passing in an existing string of TOML data. This TOML data will
     #       be used when dumping to attempt to minimize any changes done to the
     #       document, including things like comments and newlines and such.
-
-    # First we need to go through our data and generate a mapping of tables to
-    # values, we want our tables to be in order from most specific to least
-    # specific by default, so we'll go ahead and do that.
-    output = collections.OrderedDict()
-    stack = collections.deque([(tuple(), data)])
-    while stack:
-        name, current = stack.popleft()
-        output[name] = collections.OrderedDict()
-
-        # We need to seperate anything that isn't a dictionary from anything
-        # that is, that is because dictionaries will be handled differently
-        # than anything else will be here.
-        for key, value in current.items():
-            if isinstance(value, collections.Mapping):
-                stack.append((name + (key,), value))
-            else:
-                output[name][key] = value
-
-    # Now we go through this table by table and build up a FST containing all
-    # of our items here. We're going to use a nice set of whitespace here to
-    # make the document more readable.
-    # TODO: Should we allow customizing what the whitespace ends up being?
-    root = current = _nodes.Document()
-    while output:
-        table_name, values = output.popitem(last=False)
-        if table_name:
-            # Create our table.
-            table = current = _nodes.Table()
-            table.parent = root
-
-            # Create our table definition.
-            table_def = _nodes.TableName()
-            table_def.parent = table
-            _nodes.OpenBracket(content="[").parent = table_def
-            for i, part in enumerate(table_name):
-                if i:
-                    _nodes.Dot(content=".").parent = table_def
-                # Determine what type of key we're able to use, preferring bare
-                # keys but falling back to basic strings or string literals
-                # where needed.
-                # TODO: Don't copy/paste this!
-                if re.fullmatch(_lexer._BARE_KEY, part):
-                    _nodes.BareKey(content=part).parent = table_def
-                else:
-                    raise NotImplementedError("Only bare keys implemented.")
-            _nodes.CloseBracket(content="]").parent = table_def
-
-            # End the table with a new line.
-            _nodes.LineEnd(content="\n").parent = table
-
-        for key, value in values.items():
-            # TODO: These should not be a big hardcoded if/elif/else chain.
-            if not isinstance(key, six.string_types):
-                raise ValueError("Cannot dump nonstring key: {!r}".format(key))
-
-            value_stmt = _nodes.ValueStatement()
-            value_stmt.parent = current
-
-            # Determine what type of key we're able to use, preferring bare
-            # keys but falling back to basic strings or string literals where
-            # needed.
-            if re.fullmatch(_lexer._BARE_KEY, key):
-                _nodes.BareKey(content=key).parent = value_stmt
-            else:
-                raise NotImplementedError("Only bare keys implemented.")
-
-            _nodes.Whitespace(content=" ").parent = value_stmt
-            _nodes.Assignment(content="=").parent = value_stmt
-            _nodes.Whitespace(content=" ").parent = value_stmt
-
-            if isinstance(value, six.string_types):
-                # TODO: We need to figure out how to _actually_ serialize this
-                #       because this isn't really the right way.
-                _nodes.BasicString(content='"{}"'.format(value)).parent = \
-                    value_stmt
-            elif isinstance(value, six.integer_types):
-                _nodes.Integer(content=str(value)).parent = value_stmt
-            elif (isinstance(value, datetime.datetime)
-                    and value.tzinfo is not None):
-                if value.utcoffset():
-                    v = value.strftime("%Y-%m-%dT%H:%M:%S%z")
-                    value = v[:-2] + ":" + v[-2:]
-                else:
-                    value = value.strftime("%Y-%m-%dT%H:%M:%SZ")
-                _nodes.OffsetDateTime(content=value).parent = value_stmt
-            else:
-                raise NotImplementedError("{!r} not implemented.".format(value))  # noqa
-
-            _nodes.LineEnd(content="\n").parent = current
-
-        # If we have more to do, add another newline.
-        if output:
-            _nodes.LineEnd(content="\n").parent = current
-
-    return root.render()
+    stats = _instrument.active()
+    if stats is not None:
+        return stats.dump(iterdump(data))
+    return "".join(iterdump(data))
@@ -0,0 +1,84 @@
+import asyncio
+import contextlib
+
+import six
+
+from . import _lexer, _parser
+
+
+def _lex(data):
+    if isinstance(data, six.string_types):
+        return _lexer.lex(data)
+    return _lexer.lex_bytes(data)
+
+
+def _loads(data):
+    return _parser.parse(_lex(data), _parser.ValueState())
+
+
+def _load_path(path):
+    with open(path, "rb") as fp:
+        return _parser.parse(_lexer.lex_file(fp), _parser.ValueState())
+
+
+def _read_path(path):
+    with open(path, "rb") as fp:
+        return fp.read()
+
+
+async def _in_executor(executor, fn, *args):
+    # Cancelling the task that is waiting on us will cancel the work in the
+    # executor if it hasn't started yet, otherwise it will run to completion
+    # in the background and its result (or error) will be thrown away. Either
+    # way, there's nothing for the caller to clean up.
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, fn, *args)
+
+
+async def _cooperative(data, yield_every):
+    # Every LINE_END ends a statement, and the statements on any number of
+    # whole lines are a valid document all on their own, so we can parse the
+    # document a chunk of lines at a time, going back to the event loop after
+    # each chunk. Sharing the same state between every chunk means that we
+    # end up with exactly what parsing the whole document at once would have
+    # given us, including any errors.
+    state = _parser.ValueState()
+    chunk, line_start = [], False
+
+    # The lexer holds onto the document (which might be a mmap or a
+    # memoryview) until it's finished, so make sure that it is finished even
+    # if we're cancelled part way through.
+    with contextlib.closing(_lex(data)) as tokens:
+        for token in tokens:
+            if line_start and len(chunk) >= yield_every:
+                _parser.parse(chunk, state)
+                chunk = []
+                await asyncio.sleep(0)
+            chunk.append(token)
+            line_start = token.name == "LINE_END"
+
+    return _parser.parse(chunk, state)
+
+
+async def aloads(data, executor=None, yield_every=None):
+    # Loads a document without blocking the event loop for the entire time
+    # that it takes. By default the document is loaded in an executor (the
+    # loop's default executor unless another is given). When yield_every is
+    # given, it is instead loaded on the event loop itself, going back to the
+    # loop after roughly every yield_every tokens.
+    if yield_every is None:
+        return await _in_executor(executor, _loads, data)
+    if yield_every < 1:
+        raise ValueError("yield_every must be at least 1.")
+    return await _cooperative(data, yield_every)
+
+
+async def aload(path, executor=None, yield_every=None):
+    # Like aloads(), but for the file at the given path. The file is always
+    # read in an executor, so that reading it never blocks the event loop.
+    if yield_every is None:
+        return await _in_executor(executor, _load_path, path)
+    if yield_every < 1:
+        raise ValueError("yield_every must be at least 1.")
+    data = await _in_executor(executor, _read_path, path)
+    return await _cooperative(data, yield_every)
@@ -0,0 +1,81 @@
+import collections
+import os
+import pickle
+import sys
+
+from ._lexer import lex, lex_file
+from ._parser import ValueState, parse
+
+
+LoadResult = collections.namedtuple("LoadResult", ["path", "data", "error"])
+
+
+def _warm():
+    # Importing toml builds (or loads from the cache) the parser tables, but we
+    # also parse a tiny document so that everything else a parse touches is
+    # ready to go before the first real file shows up.
+    parse(lex("a = 1\n"), ValueState())
+
+
+def _load(path):
+    try:
+        with open(path, "rb") as fp:
+            return LoadResult(path, parse(lex_file(fp), ValueState()), None)
+    except Exception as exc:
+        # A single bad file shouldn't take the whole batch down with it, so we
+        # hand the error back as part of the result. The error has to make it
+        # back across a process boundary, so if it can't be pickled we replace
+        # it with something that can.
+        try:
+            pickle.dumps(exc)
+        except Exception:
+            exc = RuntimeError("{}: {}".format(type(exc).__name__, exc))
+        return LoadResult(path, None, exc)
+
+
+def _free_threaded():
+    # On free threaded builds of Python, threads can parse files in parallel,
+    # which saves us from having to send the results between processes.
+    is_gil_enabled = getattr(sys, "_is_gil_enabled", None)
+    return is_gil_enabled is not None and not is_gil_enabled()
+
+
+def load_many(paths, workers=None, ordered=True, chunksize=None):
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    # Parsing is CPU bound, so with only a single worker there is nothing to
+    # be gained from a pool, and we just load each file in turn.
+    if workers <= 1:
+        for path in paths:
+            yield _load(path)
+        return
+
+    # Sending each file to the workers one at a time means paying for a round
+    # trip to the pool for every file, which for small files can cost more than
+    # parsing them, so we send them over in batches.
+    if chunksize is None:
+        if hasattr(paths, "__len__"):
+            chunksize = max(1, min(64, len(paths) // (workers * 4)))
+        else:
+            chunksize = 16
+
+    # Importing multiprocessing is slow enough to be noticeable in the import
+    # time of toml as a whole, so we put it off until we need a pool.
+    import multiprocessing
+    import multiprocessing.pool
+
+    if _free_threaded():
+        pool = multiprocessing.pool.ThreadPool(workers, initializer=_warm)
+    else:
+        pool = multiprocessing.Pool(workers, initializer=_warm)
+
+    try:
+        imap = pool.imap if ordered else pool.imap_unordered
+        for result in imap(_load, paths, chunksize):
+            yield result
+    finally:
+        # If we've been stopped early there may still be work in the pool, and
+        # we don't want to wait around for it.
+        pool.terminate()
+        pool.join()
@@ -0,0 +1,93 @@
+import collections
+import os
+import threading
+
+from types import MappingProxyType
+
+from ._lexer import lex_file
+from ._parser import ValueState, parse
+
+
+CacheInfo = collections.namedtuple(
+    "CacheInfo",
+    ["hits", "misses", "evictions", "entries", "bytes", "max_entries",
+     "max_bytes"],
+)
+
+
+def freeze(value):
+    # Values handed out of the cache are shared between every caller, so we
+    # make them read only to stop one caller from changing what another sees.
+    if isinstance(value, dict):
+        return MappingProxyType({k: freeze(v) for k, v in value.items()})
+    elif isinstance(value, list):
+        return tuple(freeze(v) for v in value)
+    return value
+
+
+class ParseCache(object):
+    # A thread safe, least recently used cache of loaded TOML files, keyed on
+    # the path of the file and invalidated whenever the size or modification
+    # time of that file changes. The cache is bounded both by the number of
+    # files in it, and by the total size of the TOML source of those files.
+
+    def __init__(self, max_entries=128, max_bytes=64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+        self._lock = threading.Lock()
+        self._entries = collections.OrderedDict()
+        self._bytes = 0
+        self._hits = self._misses = self._evictions = 0
+
+    def load(self, path):
+        path = os.path.abspath(path)
+
+        with open(path, "rb") as fp:
+            # We stat the file that we've actually opened, so that the key we
+            # store alongside the value always matches the file we parsed.
+            stat = os.fstat(fp.fileno())
+            key = (stat.st_size, stat.st_mtime_ns)
+
+            with self._lock:
+                entry = self._entries.get(path)
+                if entry is not None and entry[0] == key:
+                    self._hits += 1
+                    self._entries.move_to_end(path)
+                    return entry[1]
+                self._misses += 1
+
+            # We don't hold the lock while parsing, so multiple threads can
+            # parse different files at the same time.
+            value = freeze(parse(lex_file(fp), ValueState()))
+
+        with self._lock:
+            self._discard(path)
+            if stat.st_size <= self.max_bytes and self.max_entries > 0:
+                self._entries[path] = (key, value)
+                self._bytes += stat.st_size
+                while (len(self._entries) > self.max_entries
+                        or self._bytes > self.max_bytes):
+                    self._discard(next(iter(self._entries)))
+                    self._evictions += 1
+
+        return value
+
+    def _discard(self, path):
+        entry = self._entries.pop(path, None)
+        if entry is not None:
+            (size, _), _ = entry
+            self._bytes -= size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self._hits = self._misses = self._evictions = 0
+
+    def info(self):
+        with self._lock:
+            return CacheInfo(
+                self._hits, self._misses, self._evictions, len(self._entries),
+                self._bytes, self.max_entries, self.max_bytes,
+            )
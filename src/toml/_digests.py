@@ -0,0 +1,59 @@
+import collections
+
+from . import _parser
+
+
+TableDiff = collections.namedtuple(
+    "TableDiff", ["added", "removed", "changed"],
+)
+
+
+def _trim(data, start, end):
+    # Any blank lines or comments at the end of a section are much more
+    # likely to be there to separate it from, or describe, the table after
+    # it, so we leave them out. Otherwise adding a table to the end of the
+    # document would look like a change to the table before it.
+    while end > start:
+        line_start = max(start, data.rfind("\n", start, end - 1) + 1)
+        line = data[line_start:end].strip()
+        if line and not line.startswith("#"):
+            break
+        end = line_start
+    return end
+
+
+def table_digests(data):
+    # Computes a digest of the source of each table in the document, keyed by
+    # the name of that table, with the root table (everything before the
+    # first table header) named (). This only needs to find the table
+    # headers, nothing gets parsed, so it's much cheaper than loading the
+    # document, though it also means that changing just the formatting of a
+    # table will change its digest.
+    #
+    # Importing hashlib takes a noticeable amount of time, so we only do it
+    # when we need it.
+    import hashlib
+
+    digests = {}
+    for name, start, end in _parser.table_sections(data):
+        if name in digests:
+            raise ValueError("Duplicate table: {}".format(".".join(name)))
+        source = data[start:_trim(data, start, end)]
+        digests[name] = hashlib.blake2b(
+            source.encode("utf8"), digest_size=16,
+        ).hexdigest()
+
+    return digests
+
+
+def diff_tables(old, new):
+    # Compares two sets of digests, returning the names of the tables that
+    # were added, removed, or whose source has changed.
+    return TableDiff(
+        added={name for name in new if name not in old},
+        removed={name for name in old if name not in new},
+        changed={
+            name for name in new
+            if name in old and new[name] != old[name]
+        },
+    )
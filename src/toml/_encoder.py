@@ -0,0 +1,234 @@
+import array
+import collections
+import datetime
+import re
+
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+
+import six
+
+from . import _lexer, _nodes
+
+
+# Values are encoded in two different ways, either straight to text when we're
+# serializing a document, or to nodes when we're editing the FST of an existing
+# document, these share everything but the final step.
+
+
+# Keys tend to be repeated a lot throughout a document, such as the same keys
+# showing up in every table of an array, so we remember how we formatted the
+# most recent ones. This is capped so that dumping lots of unique keys doesn't
+# hold onto all of them forever.
+_keys = {}
+_MAX_KEYS = 4096
+
+
+def format_key(key):
+    try:
+        return _keys[key]
+    except (KeyError, TypeError):
+        pass
+
+    if not isinstance(key, six.string_types):
+        raise ValueError("Cannot dump nonstring key: {!r}".format(key))
+
+    # Determine what type of key we're able to use, preferring bare keys but
+    # falling back to basic strings or string literals where needed.
+    if _lexer._bare_key_re.fullmatch(key):
+        if len(_keys) >= _MAX_KEYS:
+            _keys.clear()
+        _keys[key] = key
+        return key
+    else:
+        raise NotImplementedError("Only bare keys implemented.")
+
+
+# Each type that we know how to dump has an encoder, which turns a value of
+# that type into the node class and content for it. Values are looked up by
+# their exact type, and the first time we see a type we walk its MRO to find
+# the closest type that has an encoder and remember it, so subclasses work
+# and dispatch costs the same no matter how many types we support.
+_encoders = {}
+_dispatch = {}
+
+
+def _boolean(value):
+    return _nodes.Boolean, "true" if value else "false"
+
+
+# Quotes, backslashes and control characters are the only characters that
+# can't appear in a basic string as is.
+_escape_re = re.compile(r'["\\\x00-\x1f]')
+_escapes = {
+    "\b": "\\b", "\t": "\\t", "\n": "\\n", "\f": "\\f", "\r": "\\r",
+    '"': '\\"', "\\": "\\\\",
+}
+
+
+def _escape(match):
+    char = match.group()
+    return _escapes.get(char) or "\\u{:04X}".format(ord(char))
+
+
+def _string(value):
+    return _nodes.BasicString, '"{}"'.format(_escape_re.sub(_escape, value))
+
+
+def _integer(value):
+    # Subclasses of int can change what str() gives us (an IntEnum does, on
+    # older versions of Python), so we always format the number itself.
+    return _nodes.Integer, "%d" % value
+
+
+def _datetime(value):
+    if value.tzinfo is None:
+        raise NotImplementedError("{!r} not implemented.".format(value))
+
+    v = value.strftime("%Y-%m-%dT%H:%M:%S")
+    if value.microsecond:
+        v += ".{:06d}".format(value.microsecond)
+
+    offset = value.strftime("%z")
+    if value.utcoffset():
+        return _nodes.OffsetDateTime, v + offset[:-2] + ":" + offset[-2:]
+    else:
+        return _nodes.OffsetDateTime, v + "Z"
+
+
+# Since bool is a subclass of int, it needs its own encoder or else it would
+# end up with the one for integers.
+_encoders[bool] = _boolean
+_encoders[datetime.datetime] = _datetime
+for _type in six.string_types:
+    _encoders[_type] = _string
+for _type in six.integer_types:
+    _encoders[_type] = _integer
+
+
+def register_encoder(type_, encoder):
+    # Allows dumping values of a type that we don't otherwise support, such
+    # as Decimal or an Enum, by having encoder convert them into a scalar
+    # value that we do support.
+    def convert(value):
+        return _scalar(encoder(value))
+
+    _encoders[type_] = convert
+    _dispatch.clear()
+
+
+def _resolve(cls):
+    for base in getattr(cls, "__mro__", (cls,)):
+        if base in _encoders:
+            return _encoders[base]
+
+
+def _scalar(value):
+    # Returns the node class and content for a single, non array, value.
+    cls = type(value)
+    try:
+        encoder = _dispatch[cls]
+    except KeyError:
+        encoder = _dispatch[cls] = _resolve(cls)
+    if encoder is None:
+        raise NotImplementedError("{!r} not implemented.".format(value))
+    return encoder(value)
+
+
+# Besides lists, we also dump tuples and array.arrays as arrays, since that is
+# what load_cached() and loads(array_type="array") hand back.
+_array_types = (list, tuple, array.array)
+
+
+def format_value(value):
+    if isinstance(value, _array_types):
+        return "[{}]".format(", ".join(format_value(v) for v in value))
+    return _scalar(value)[1]
+
+
+def encode_key(key):
+    return _nodes.BareKey(content=format_key(key))
+
+
+def encode_value(value):
+    if isinstance(value, _array_types):
+        array = _nodes.Array()
+        _nodes.OpenBracket(content="[").parent = array
+        for i, item in enumerate(value):
+            if i:
+                _nodes.Comma(content=",").parent = array
+                _nodes.Whitespace(content=" ").parent = array
+            encode_value(item).parent = array
+        _nodes.CloseBracket(content="]").parent = array
+        return array
+
+    node_class, content = _scalar(value)
+    return node_class(content=content)
+
+
+def encode_statement(key, value):
+    # We're going to use a nice set of whitespace here to make the document
+    # more readable.
+    stmt = _nodes.ValueStatement()
+    encode_key(key).parent = stmt
+    _nodes.Whitespace(content=" ").parent = stmt
+    _nodes.Assignment(content="=").parent = stmt
+    _nodes.Whitespace(content=" ").parent = stmt
+    encode_value(value).parent = stmt
+    return stmt
+
+
+def encode_table(name):
+    table = _nodes.Table()
+    table_name = _nodes.TableName()
+    table_name.parent = table
+    _nodes.OpenBracket(content="[").parent = table_name
+    for i, part in enumerate(name):
+        if i:
+            _nodes.Dot(content=".").parent = table_name
+        encode_key(part).parent = table_name
+    _nodes.CloseBracket(content="]").parent = table_name
+
+    # End the table with a new line.
+    _nodes.LineEnd(content="\n").parent = table
+    return table
+
+
+def iterdump(data):
+    # Serializes our data one line at a time, walking through the tables in
+    # it from least to most specific, so that we never need to hold onto more
+    # than the list of tables that we have yet to get to.
+    # TODO: Should we allow customizing what the whitespace ends up being?
+    queue = collections.deque([((), data)])
+    while queue:
+        name, table = queue.popleft()
+        if name:
+            yield "[{}]\n".format(".".join(format_key(part) for part in name))
+
+        # Sub tables get written out once we've finished with this one, and
+        # everything else is a value within this table.
+        for key, value in table.items():
+            if isinstance(value, Mapping):
+                queue.append((name + (key,), value))
+            else:
+                yield "{} = {}\n".format(format_key(key), format_value(value))
+
+        # If we have more to do, add another newline.
+        if queue:
+            yield "\n"
+
+
+def batched(chunks, size):
+    # Joins small chunks together into larger ones of at least the given size,
+    # so that writing them out doesn't take a call to write() for every line.
+    batch, length = [], 0
+    for chunk in chunks:
+        batch.append(chunk)
+        length += len(chunk)
+        if length >= size:
+            yield "".join(batch)
+            batch, length = [], 0
+    if batch:
+        yield "".join(batch)
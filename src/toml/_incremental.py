@@ -0,0 +1,389 @@
+import bisect
+
+from . import _encoder, _instrument, _lexer, _parser
+from ._nodes import LineEnd, Table, ValueStatement
+from ._utils import Builder
+
+
+class Section(object):
+    # A single top level section of a document, which is either everything
+    # before the first table header, or a single table. Sections always start
+    # at the start of a line, and none of our tokens can span lines, so each
+    # one can be parsed and compiled on its own.
+
+    __slots__ = ("nodes", "name", "length", "_compiled", "_arrays")
+
+    def __init__(self, nodes):
+        self.nodes = nodes
+        self.length = sum(len(node.render()) for node in nodes)
+        self._compiled = None
+        self._arrays = ()
+
+        # The name of the table that this section defines, or an empty name
+        # for the root table.
+        self.name = ()
+        if nodes and isinstance(nodes[0], Table):
+            self.name = tuple(nodes[0].children[0].compile())
+
+    def compile(self):
+        # Returns the name of the table that this section defines, along with
+        # the values that it defines directly within that table.
+        if self._compiled is None:
+            builder = Builder()
+            for node in self.nodes:
+                if not node.noise:
+                    node.build(builder)
+
+            name, values = self.name, builder.output
+            for part in name:
+                values = values[part]
+
+            # Arrays are the only mutable values that a section compiles to,
+            # and we hand those out to every caller, so we need to remember
+            # where they are so that each caller can get their own copy.
+            self._arrays = [
+                key for key, value in values.items()
+                if isinstance(value, list)
+            ]
+            self._compiled = name, values
+        return self._compiled
+
+    def build(self, builder):
+        name, values = self.compile()
+        if name:
+            builder.table(name)
+        if self._arrays:
+            values = dict(values)
+            for key in self._arrays:
+                values[key] = _copy(values[key])
+        builder.update(values)
+
+
+def _sections(document):
+    # Everything before the first Table is the first section, after that each
+    # Table is a section all on its own.
+    children = document.children
+    preamble = _preamble(document)
+    sections = [Section(children[:preamble])]
+    sections.extend(Section([table]) for table in children[preamble:])
+    return sections
+
+
+def _preamble(document):
+    # Every node before the first Table is a part of the root table.
+    children = document.children
+    preamble = 0
+    while (preamble < len(children)
+            and not isinstance(children[preamble], Table)):
+        preamble += 1
+    return preamble
+
+
+def _line_end(children, index):
+    # The index just past the end of the line that the given child is on.
+    while not isinstance(children[index], LineEnd):
+        index += 1
+    return index + 1
+
+
+def _statement_key(statement):
+    for node in statement.children:
+        if not node.noise:
+            return node.compile()
+
+
+def _copy(value):
+    if isinstance(value, list):
+        return [_copy(v) for v in value]
+    return value
+
+
+def _parse(tokens, section=False):
+    # Building a FST goes through the active Stats, if there are any, so that
+    # it's instrumented just like loading a document is. Reparsing part of a
+    # document after an edit isn't a call of its own.
+    stats = _instrument.active()
+    if stats is None:
+        return _parser.parse(tokens)
+    parse = stats.parse_section if section else stats.parse
+    return parse(tokens, _parser.ParserState())
+
+
+class ParsedDocument(object):
+    # A parsed document that can be edited as text, reparsing only the
+    # sections of the document that an edit touches, and recompiling only
+    # those sections the next time the document is compiled.
+
+    def __init__(self, text):
+        self.text = text
+        self.document = None
+        self.error = None
+        self._sections = []
+        self._parse()
+
+    def _parse(self):
+        try:
+            self.document = _parse(_lexer.lex(self.text))
+        except Exception as exc:
+            # Documents that are being edited will spend a lot of their time
+            # being invalid, so rather than refusing the edit, we hold onto
+            # the error until the next time the document is valid again.
+            self.document, self.error, self._sections = None, exc, []
+        else:
+            self.error = None
+            self._sections = _sections(self.document)
+
+    def edit(self, offset, deleted, inserted):
+        if not 0 <= offset <= offset + deleted <= len(self.text):
+            raise ValueError("Edit is outside of the document.")
+
+        old_text = self.text
+        self.text = old_text[:offset] + inserted + old_text[offset + deleted:]
+
+        # If our last parse failed, then we don't have anything to reuse.
+        if self.document is None:
+            self._parse()
+            return
+
+        try:
+            self._reparse(offset, deleted, len(inserted) - deleted)
+        except Exception:
+            # If the sections that we've reparsed aren't valid, the document as
+            # a whole isn't either, so a full parse will get us the error.
+            self._parse()
+
+    def _reparse(self, offset, deleted, delta):
+        sections = self._sections
+        starts, start = [], 0
+        for section in sections:
+            starts.append(start)
+            start += section.length
+
+        # Find the sections that contain the start and the end of our edit,
+        # in the offsets of the document before the edit was made.
+        first = bisect.bisect_right(starts, offset) - 1
+        last = bisect.bisect_right(starts, offset + deleted - 1) - 1
+        last = max(first, last)
+
+        while True:
+            start = starts[first]
+            end = starts[last] + sections[last].length + delta
+
+            # If our edit has run a section into the next one, then we need to
+            # reparse that one too.
+            if last < len(sections) - 1 and not self.text.endswith(
+                    "\n", start, end):
+                last += 1
+                continue
+
+            reparsed = _sections(
+                _parse(_lexer.lex(self.text, start, end), section=True),
+            )
+
+            # If our edit has removed a table header, then whatever was in
+            # that table now belongs to the previous section.
+            if first > 0 and reparsed[0].nodes:
+                first -= 1
+                continue
+            break
+
+        # Splice the new sections into our Document, each section is a single
+        # node, except for the first one, which holds every node before the
+        # first table.
+        preamble = len(sections[0].nodes)
+        if first == 0:
+            child_start = 0
+        else:
+            child_start = preamble + first - 1
+            reparsed = reparsed[1:]
+        child_stop = preamble + last
+
+        self.document.splice(
+            child_start, child_stop,
+            [node for section in reparsed for node in section.nodes],
+        )
+        sections[first:last + 1] = reparsed
+
+    # Besides editing the text of the document, the document can be edited
+    # structurally, by setting and deleting keys and tables. These edit the
+    # FST in place, so everything else in the document, including comments
+    # and formatting, is left exactly as it was.
+
+    def set(self, path, value):
+        self._check()
+        path = tuple(path)
+        if not path:
+            raise ValueError("Cannot set the root table.")
+        name, key = path[:-1], path[-1]
+
+        for section in self._sections:
+            if section.name[:len(path)] == path:
+                raise ValueError(
+                    "Cannot set {}, it is a table.".format(".".join(path))
+                )
+
+        # Everything that we're going to add to the document is encoded before
+        # we change anything, so that if something can't be encoded the
+        # document is left exactly as it was.
+        i = self._find_section(name)
+        index = table = None
+        if i is None:
+            self._check_table(name)
+            table = _encoder.encode_table(name)
+        else:
+            container, start, stop = self._container(i)
+            index = self._find_statement(container, start, stop, key)
+
+        if index is not None:
+            # Replace just the value, leaving the key and any formatting
+            # around it alone.
+            node = _encoder.encode_value(value)
+            statement = container.children[index]
+            j = max(
+                j for j, child in enumerate(statement.children)
+                if not child.noise
+            )
+            statement.splice(j, j + 1, [node])
+        else:
+            # New keys go on the line after the last key in their table, or
+            # right after the table's header if it doesn't have any yet.
+            statement = _encoder.encode_statement(key, value)
+            if table is not None:
+                i = self._add_table(table)
+                container, start, stop = self._container(i)
+            if i == 0:
+                index = stop
+            else:
+                index = _line_end(container.children, 0)
+            for j in range(start, stop):
+                if isinstance(container.children[j], ValueStatement):
+                    index = _line_end(container.children, j)
+            container.splice(
+                index, index, [statement, LineEnd(content="\n")],
+            )
+
+        self._changed(i)
+
+    def add_table(self, name):
+        self._check()
+        name = tuple(name)
+        if self._find_section(name) is not None:
+            raise ValueError("Duplicate table: {}".format(".".join(name)))
+        self._check_table(name)
+        self._add_table(_encoder.encode_table(name))
+        self.text = self.document.render()
+
+    def delete(self, path):
+        self._check()
+        path = tuple(path)
+        if not path:
+            raise KeyError(path)
+
+        # Deleting a table removes its entire section, but leaves any of the
+        # tables beneath it alone.
+        i = self._find_section(path)
+        if i:
+            index = len(self._sections[0].nodes) + i - 1
+            self.document.splice(index, index + 1, [])
+            del self._sections[i]
+            self.text = self.document.render()
+            return
+
+        i = self._find_section(path[:-1])
+        if i is None:
+            raise KeyError(path)
+        container, start, stop = self._container(i)
+        index = self._find_statement(container, start, stop, path[-1])
+        if index is None:
+            raise KeyError(path)
+
+        # Remove the rest of the line along with the statement, so that any
+        # comment that was on it goes too.
+        container.splice(index, _line_end(container.children, index), [])
+        self._changed(i)
+
+    def _check(self):
+        if self.document is None:
+            raise ValueError("Cannot edit an invalid document.")
+
+    def _find_section(self, name):
+        for i, section in enumerate(self._sections):
+            if section.name == name:
+                return i
+
+    def _container(self, i):
+        # The node that holds everything in a section, along with the range of
+        # its children that belong to that section.
+        if i == 0:
+            return self.document, 0, len(self._sections[0].nodes)
+        table = self._sections[i].nodes[0]
+        return table, 1, len(table.children)
+
+    def _find_statement(self, container, start, stop, key):
+        for index in range(start, stop):
+            node = container.children[index]
+            if (isinstance(node, ValueStatement)
+                    and _statement_key(node) == key):
+                return index
+
+    def _check_table(self, name):
+        # A table can't be defined where a key has already been defined, or
+        # anywhere beneath one.
+        for n in range(1, len(name) + 1):
+            i = self._find_section(name[:n - 1])
+            if i is None:
+                continue
+            container, start, stop = self._container(i)
+            key = name[n - 1]
+            if self._find_statement(container, start, stop, key) is not None:
+                raise ValueError(
+                    "Cannot define table {}, {} is not a table.".format(
+                        ".".join(name), ".".join(name[:n]),
+                    )
+                )
+
+    def _add_table(self, table):
+        # New tables go at the end of the document, with a blank line between
+        # them and whatever came before. The caller is responsible for
+        # rendering the document again once it's done changing it.
+        if self.text and not self.text.endswith("\n\n"):
+            last = len(self._sections) - 1
+            container, _, _ = self._container(last)
+            LineEnd(content="\n").parent = container
+            self._section_changed(last)
+
+        table.parent = self.document
+        self._sections.append(Section([table]))
+        return len(self._sections) - 1
+
+    def _section_changed(self, i):
+        # Our section has changed, so we need to forget anything we knew about
+        # it.
+        if i == 0:
+            self._sections[0] = Section(
+                self.document.children[:_preamble(self.document)],
+            )
+        else:
+            self._sections[i] = Section(self._sections[i].nodes)
+
+    def _changed(self, i):
+        # Once a section has changed, the document needs to be rendered again.
+        self._section_changed(i)
+        self.text = self.document.render()
+
+    def compile(self):
+        if self.error is not None:
+            raise self.error
+
+        # Every section has cached what it compiled to, so all we have left
+        # to do is put those sections together, checking for any duplicated
+        # keys or tables along the way.
+        builder = Builder()
+        for section in self._sections:
+            section.build(builder)
+        return builder.output
+
+    def render(self):
+        if self.document is None:
+            return self.text
+        return self.document.render()
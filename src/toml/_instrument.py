@@ -0,0 +1,136 @@
+import collections
+import contextlib
+import threading
+import time
+
+from ._parser import ParserState, parse
+
+
+# The Stats that are currently being collected on each thread, if any. When
+# nothing is being collected the only cost to loads() and dumps() is looking
+# this up once per call.
+_local = threading.local()
+
+
+def active():
+    return getattr(_local, "stats", None)
+
+
+class Stats(object):
+    # Collects where the time goes while loading and dumping documents, along
+    # with some counters about what was processed. Times are in seconds, keyed
+    # by stage:
+    #
+    #   lex     Turning the document into tokens.
+    #   parse   Parsing the tokens, and compiling them into Python values.
+    #   scan    Finding the tables in a document that is loaded lazily.
+    #   dump    Serializing values, and writing them out for dump().
+    #
+    # When a FST is built, such as by parse(), nodes counts every node that
+    # was created and peak_nodes is the most that were created for any one
+    # tree.
+
+    def __init__(self):
+        self.calls = 0
+        self.times = collections.Counter()
+        self.tokens = collections.Counter()
+        self.nodes = 0
+        self.peak_nodes = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def __repr__(self):
+        return (
+            "<{} calls={} times={} tokens={} nodes={} peak_nodes={} "
+            "bytes_in={} bytes_out={}>".format(
+                self.__class__.__name__, self.calls, dict(self.times),
+                sum(self.tokens.values()), self.nodes, self.peak_nodes,
+                self.bytes_in, self.bytes_out,
+            )
+        )
+
+    @contextlib.contextmanager
+    def timed(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.times[stage] += time.perf_counter() - start
+
+    def lex(self, tokens):
+        # The lexer runs interleaved with the parser, pulling one token at a
+        # time, so the only way to tell them apart is to time each call into
+        # the lexer.
+        clock = time.perf_counter
+        counts = self.tokens
+        elapsed = 0.0
+        tokens = iter(tokens)
+        try:
+            while True:
+                start = clock()
+                try:
+                    token = next(tokens)
+                except StopIteration:
+                    break
+                finally:
+                    elapsed += clock() - start
+                counts[token.name] += 1
+                yield token
+        finally:
+            self.times["lex"] += elapsed
+
+    def parse(self, tokens, state):
+        self.calls += 1
+        return self.parse_section(tokens, state)
+
+    def parse_section(self, tokens, state):
+        # Like parse(), but for one part of a document that is being parsed
+        # a piece at a time, so it doesn't count as a call of its own.
+        lexed = self.times["lex"]
+        start = time.perf_counter()
+        try:
+            return parse(self.lex(tokens), state)
+        finally:
+            self.times["parse"] += (
+                time.perf_counter() - start - (self.times["lex"] - lexed)
+            )
+            if isinstance(state, ParserState):
+                self.nodes += state.nodes
+                self.peak_nodes = max(self.peak_nodes, state.nodes)
+
+    def dump(self, chunks):
+        self.calls += 1
+        with self.timed("dump"):
+            output = "".join(chunks)
+        self.bytes_out += len(output.encode("utf8"))
+        return output
+
+
+class CountingReader(object):
+    # Wraps a file object to count the bytes that are read from it.
+
+    def __init__(self, fp, stats):
+        self._fp = fp
+        self._stats = stats
+
+    def read(self, size=-1):
+        data = self._fp.read(size)
+        if isinstance(data, bytes):
+            self._stats.bytes_in += len(data)
+        else:
+            self._stats.bytes_in += len(data.encode("utf8"))
+        return data
+
+
+@contextlib.contextmanager
+def instrument(callback=None):
+    # Collects Stats for every load and dump done on the current thread within
+    # this block, optionally handing them to a callback once it has finished.
+    stats = Stats()
+    previous, _local.stats = active(), stats
+    try:
+        yield stats
+    finally:
+        _local.stats = previous
+        if callback is not None:
+            callback(stats)
@@ -0,0 +1,99 @@
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+
+from . import _lexer, _parser
+
+
+class LazyTable(Mapping):
+    # A read only mapping over a single table of a TOML document, which only
+    # lexes, parses, and compiles that table's part of the document the first
+    # time that something is looked up in it. Any tables beneath it are
+    # themselves LazyTables, so only the tables that are actually accessed
+    # ever get compiled.
+
+    def __init__(self, data, name):
+        self._data = data
+        self._name = name
+        self._section = None
+        self._tables = {}
+        self._values = None
+
+    def __repr__(self):
+        return "<{} {!r}>".format(
+            self.__class__.__name__, ".".join(self._name),
+        )
+
+    def __getitem__(self, key):
+        values = self._compile()
+        if key in self._tables:
+            return self._tables[key]
+        return values[key]
+
+    def __iter__(self):
+        values = self._compile()
+        for key in values:
+            yield key
+        for key in self._tables:
+            yield key
+
+    def __len__(self):
+        return len(self._compile()) + len(self._tables)
+
+    def _table(self, key):
+        if key not in self._tables:
+            self._tables[key] = LazyTable(self._data, self._name + (key,))
+        return self._tables[key]
+
+    def _compile(self):
+        if self._values is not None:
+            return self._values
+
+        values = {}
+        if self._section is not None:
+            # The section of the document that defines this table is a valid
+            # TOML document all on its own, so we can just parse it, and then
+            # dig down to the table that it defines.
+            start, end = self._section
+            if start != end:
+                values = _parser.parse(
+                    _lexer.lex(self._data, start, end), _parser.ValueState(),
+                )
+                for part in self._name:
+                    values = values[part]
+
+        # Since each table is compiled on its own, we have to do our own check
+        # that it doesn't define any keys that conflict with the tables defined
+        # beneath it.
+        for key in self._tables:
+            if key in values:
+                name = ".".join(self._name + (key,))
+                raise ValueError(
+                    "Cannot define table {}, {} is not a table.".format(
+                        name, name,
+                    )
+                )
+
+        self._values = values
+        return values
+
+
+def load(data):
+    # Build up our index of tables from the sections of the document, but
+    # don't parse any of them until they're accessed.
+    root = LazyTable(data, ())
+    sections = _parser.table_sections(data)
+    _, start, end = next(sections)
+    root._section = (start, end)
+
+    for name, start, end in sections:
+        table = root
+        for part in name:
+            table = table._table(part)
+
+        if table._section is not None:
+            raise ValueError("Duplicate table: {}".format(".".join(name)))
+        table._section = (start, end)
+
+    return root
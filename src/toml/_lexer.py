@@ -1,39 +1,436 @@
+import codecs
+import re
+
 import rply
+import six
+from rply.token import SourcePosition
 
 
 _BARE_KEY = r"[A-Za-z0-9_-]+"
-_BASIC_STRING = r'"(\\(b|t|n|f|r|"|\\|u[0-9a-fA-F]{4}|U[0-9a-fA-F]{8})|[^"\\\u0000-\u001F])*(?<!\\)"'  # noqa
+_BASIC_STRING = r'"(\\(b|t|n|f|r|"|\\|u[0-9a-fA-F]{4}|U[0-9a-fA-F]{8})|[^"\\\x00-\x1F])*(?<!\\)"'  # noqa
 _LITERAL_STRING = r"'(?![^']*\r?\n)[^']*'"
 
 
-_lexer_gen = rply.LexerGenerator()
-_lexer_gen.add("LINE_END", r"\r?\n")
-_lexer_gen.add("WHITESPACE", r"( |\t)+")
-_lexer_gen.add("COMMENT", r"#.*(?=\r?\n)")
-_lexer_gen.add("ASSIGNMENT", r"=")
-_lexer_gen.add("BOOLEAN", r"(true|false)")
-_lexer_gen.add("MULTILINE_BASIC_STRING", r'"""(\\?\r?\n|\\(b|t|n|f|r|"|\\|u[0-9a-fA-F]{4}|U[0-9a-fA-F]{8})|[^\\\u0000-\u001F])*?(?<!\\)"""')  # noqa
-_lexer_gen.add("BASIC_STRING", _BASIC_STRING)
-_lexer_gen.add("MULTILINE_LITERAL_STRING", r"'''(.|\r?\n)*?'''")
-_lexer_gen.add("LITERAL_STRING", _LITERAL_STRING)
-_lexer_gen.add("INTEGER", r"[+-]?([1-9][0-9_]*[0-9]|[0-9])(?=(\r?\n|#| |\t|,|]))")  # noqa
-_lexer_gen.add("FLOAT", r"[+-]?([1-9][0-9_]*[0-9]|[0-9])(\.[0-9]([0-9_]*[0-9]|[0-9])?)?([eE][+-]?([1-9]([0-9_]*[0-9]|[0-9])?))?(?=(\r?\n|#| |\t|,|]))")  # noqa
-_lexer_gen.add("OFFSET_DATETIME", r"[0-9]{4}-[0-9]{2}-[0-9]{2}T[0-9]{2}:[0-9]{2}:[0-9]{2}(\.[0-9]+)?(Z|[+-][0-9]{2}:[0-9]{2})")  # noqa
-_lexer_gen.add("LOCAL_DATETIME", r"[0-9]{4}-[0-9]{2}-[0-9]{2}T[0-9]{2}:[0-9]{2}:[0-9]{2}(\.[0-9]+)?")  # noqa
-_lexer_gen.add("LOCAL_DATE", r"[0-9]{4}-[0-9]{2}-[0-9]{2}")
-_lexer_gen.add("LOCAL_TIME", r"[0-9]{2}:[0-9]{2}:[0-9]{2}(\.[0-9]+)?")
-_lexer_gen.add("BARE_KEY", r"[A-Za-z0-9_-]+")
-_lexer_gen.add("OPEN_BRACKET", r"\[")
-_lexer_gen.add("CLOSE_BRACKET", r"]")
-_lexer_gen.add("OPEN_BRACE", r"{")
-_lexer_gen.add("CLOSE_BRACE", r"}")
-_lexer_gen.add("COMMA", r",")
-_lexer_gen.add("PERIOD", r"\.")
-
-
-_lexer = _lexer_gen.build()
-
-
-def lex(s):
-    for token in _lexer.lex(s):
-        yield token
+# The order of these rules is significant, at any given position in the input
+# the first rule that matches is the one that "wins", even if a later rule
+# would have matched more of the input.
+_rules = [
+    ("LINE_END", r"\r?\n"),
+    ("WHITESPACE", r"( |\t)+"),
+    ("COMMENT", r"#.*(?=\r?\n)"),
+    ("ASSIGNMENT", r"="),
+    ("BOOLEAN", r"(true|false)"),
+    ("MULTILINE_BASIC_STRING", r'"""(\\?\r?\n|\\(b|t|n|f|r|"|\\|u[0-9a-fA-F]{4}|U[0-9a-fA-F]{8})|[^\\\x00-\x1F])*?(?<!\\)"""'),  # noqa
+    ("BASIC_STRING", _BASIC_STRING),
+    ("MULTILINE_LITERAL_STRING", r"'''(.|\r?\n)*?'''"),
+    ("LITERAL_STRING", _LITERAL_STRING),
+    ("INTEGER", r"[+-]?([1-9][0-9_]*[0-9]|[0-9])(?=(\r?\n|#| |\t|,|]))"),
+    ("FLOAT", r"[+-]?([1-9][0-9_]*[0-9]|[0-9])(\.[0-9]([0-9_]*[0-9]|[0-9])?)?([eE][+-]?([1-9]([0-9_]*[0-9]|[0-9])?))?(?=(\r?\n|#| |\t|,|]))"),  # noqa
+    ("OFFSET_DATETIME", r"[0-9]{4}-[0-9]{2}-[0-9]{2}T[0-9]{2}:[0-9]{2}:[0-9]{2}(\.[0-9]+)?(Z|[+-][0-9]{2}:[0-9]{2})"),  # noqa
+    ("LOCAL_DATETIME", r"[0-9]{4}-[0-9]{2}-[0-9]{2}T[0-9]{2}:[0-9]{2}:[0-9]{2}(\.[0-9]+)?"),  # noqa
+    ("LOCAL_DATE", r"[0-9]{4}-[0-9]{2}-[0-9]{2}"),
+    ("LOCAL_TIME", r"[0-9]{2}:[0-9]{2}:[0-9]{2}(\.[0-9]+)?"),
+    ("BARE_KEY", _BARE_KEY),
+    ("OPEN_BRACKET", r"\["),
+    ("CLOSE_BRACKET", r"]"),
+    ("OPEN_BRACE", r"{"),
+    ("CLOSE_BRACE", r"}"),
+    ("COMMA", r","),
+    ("PERIOD", r"\."),
+]
+
+
+# Rather than trying each of our rules one after another at every position, we
+# combine them into a single alternation. Python's regular expression engine
+# tries the alternatives of an alternation in order, so the first rule to
+# match still wins, and the named group tells us which rule that was.
+_token_re = re.compile("|".join(
+    "(?P<{}>{})".format(name, pattern) for name, pattern in _rules
+))
+
+
+# The vast majority of tokens in a TOML document are whitespace, line endings,
+# bare keys and punctuation. For these we can tell which rule is going to win
+# just by looking at the first character, which lets us skip trying the
+# combined expression altogether.
+_single_character_tokens = {
+    "\n": "LINE_END",
+    "=": "ASSIGNMENT",
+    "[": "OPEN_BRACKET",
+    "]": "CLOSE_BRACKET",
+    "{": "OPEN_BRACE",
+    "}": "CLOSE_BRACE",
+    ",": "COMMA",
+    ".": "PERIOD",
+}
+_whitespace_re = re.compile(r"[ \t]+")
+_bare_key_re = re.compile(_BARE_KEY)
+_fast_path = {" ": ("WHITESPACE", _whitespace_re),
+              "\t": ("WHITESPACE", _whitespace_re)}
+_fast_path.update(
+    (char, (name, None)) for char, name in _single_character_tokens.items()
+)
+# Anything that starts with a letter (other than the "t" and "f" that might
+# start a boolean) or an underscore can only ever be a bare key.
+_fast_path.update(
+    (char, ("BARE_KEY", _bare_key_re))
+    for char in "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdeghijklmnopqrsuvwxyz_"
+)
+
+# Arrays of nothing but integers can be lexed as a single INTEGER_ARRAY token
+# when asked to, which saves a token (and a value, and maybe a node) for every
+# element and lets the whole array be converted at once. Since these tokens
+# can only be told apart from table headers by what comes before them, an
+# opening bracket always has to go through the combined expression.
+_INTEGER = r"[+-]?([1-9][0-9_]*[0-9]|[0-9])"
+_integer_array_token_re = re.compile(
+    r"(?P<INTEGER_ARRAY>\[[ \t]*{0}([ \t]*,[ \t]*{0})*[ \t]*\])|".format(
+        _INTEGER,
+    ) + _token_re.pattern
+)
+_integer_array_fast_path = dict(_fast_path)
+del _integer_array_fast_path["["]
+
+# Whitespace and comments have no meaning to the parser, however we still need
+# to hold onto them so that we can faithfully render the document again.
+_trivia_tokens = {"WHITESPACE", "COMMENT"}
+
+# The only tokens that are able to contain a new line.
+_multiline_strings = {"MULTILINE_BASIC_STRING", "MULTILINE_LITERAL_STRING"}
+_multiline_tokens = _multiline_strings | {"LINE_END"}
+
+
+class Token(rply.Token):
+
+    def __init__(self, name, value, source_pos=None):
+        super(Token, self).__init__(name, value, source_pos)
+        self.leading = self.trailing = ()
+
+
+def _match(s, pos, end):
+    # Figure out which token starts at the given position, returning its name
+    # and value, or (None, None) if nothing does.
+    rule = _fast_path.get(s[pos])
+    if rule is None:
+        match = _token_re.match(s, pos, end)
+        if match is None:
+            return None, None
+        return match.lastgroup, match.group()
+
+    name, pattern = rule
+    if pattern is None:
+        return name, s[pos]
+    return name, pattern.match(s, pos, end).group()
+
+
+def lex(s, start=0, end=None, integer_arrays=False):
+    # We can lex just a part of a larger document, in which case the document
+    # will be treated exactly as if it had been sliced, except that any source
+    # positions will still be relative to the start of the entire document.
+    pos = start
+    if end is None:
+        end = len(s)
+    lineno = s.count("\n", 0, pos) + 1
+    line_start = s.rfind("\n", 0, pos) + 1
+
+    if integer_arrays:
+        fast_path, token_re = _integer_array_fast_path, _integer_array_token_re
+    else:
+        fast_path, token_re = _fast_path, _token_re
+
+    while pos < end:
+        # This is the same as _match(), but inlined as this is the single
+        # hottest loop in the entire library.
+        char = s[pos]
+        rule = fast_path.get(char)
+        if rule is None:
+            match = token_re.match(s, pos, end)
+            if match is None:
+                raise rply.LexingError(
+                    None, SourcePosition(pos, lineno, pos - line_start + 1),
+                )
+            name, value = match.lastgroup, match.group()
+            if name == "INTEGER_ARRAY" and not _is_value(s, start, pos):
+                name, value = "OPEN_BRACKET", char
+        else:
+            name, pattern = rule
+            if pattern is None:
+                value = char
+            else:
+                value = pattern.match(s, pos, end).group()
+
+        yield Token(
+            name, value, SourcePosition(pos, lineno, pos - line_start + 1),
+        )
+
+        if name in _multiline_tokens:
+            newlines = value.count("\n")
+            if newlines:
+                lineno += newlines
+                line_start = pos + value.rindex("\n") + 1
+
+        pos += len(value)
+
+
+def _is_value(s, start, pos, blank=" \t", openers="=,["):
+    # Whether the opening bracket at pos starts a value, rather than a table
+    # header, which depends on the token before it.
+    pos -= 1
+    while pos >= start and s[pos] in blank:
+        pos -= 1
+    return pos >= start and s[pos] in openers
+
+
+# Every one of our rules only ever needs to look at ASCII characters to decide
+# where a token ends, so they work just as well on UTF8 encoded bytes, which
+# lets us lex a document without decoding the whole thing first.
+_byte_token_re = re.compile(_token_re.pattern.encode("ascii"))
+_byte_integer_array_token_re = re.compile(
+    _integer_array_token_re.pattern.encode("ascii")
+)
+_byte_fast_path = dict(
+    (ord(char), (name, char, pattern and re.compile(
+        pattern.pattern.encode("ascii")
+    )))
+    for char, (name, pattern) in _fast_path.items()
+)
+_byte_integer_array_fast_path = dict(_byte_fast_path)
+del _byte_integer_array_fast_path[ord("[")]
+
+
+def _byte_match(b, pos, end):
+    # Like _match(), but for a UTF8 encoded document.
+    rule = _byte_fast_path.get(b[pos])
+    if rule is None:
+        match = _byte_token_re.match(b, pos, end)
+        if match is None:
+            return None, None
+        return match.lastgroup, str(match.group(), "utf8")
+
+    name, value, pattern = rule
+    if pattern is None:
+        return name, value
+    return name, str(pattern.match(b, pos, end).group(), "ascii")
+
+
+def lex_bytes(b, start=0, end=None, integer_arrays=False):
+    # Lexes a UTF8 encoded document straight from bytes, or anything else that
+    # supports the buffer protocol (such as a bytearray, memoryview or mmap),
+    # only decoding each token as it's produced, rather than making a decoded
+    # copy of the entire document up front. Source positions are offsets in
+    # bytes rather than characters.
+    pos = start
+    if end is None:
+        end = len(b)
+    lineno, line_start = 1, 0
+    if start:
+        before = bytes(b[:start])
+        lineno = before.count(b"\n") + 1
+        line_start = before.rfind(b"\n") + 1
+
+    if integer_arrays:
+        fast_path = _byte_integer_array_fast_path
+        token_re = _byte_integer_array_token_re
+    else:
+        fast_path, token_re = _byte_fast_path, _byte_token_re
+
+    while pos < end:
+        rule = fast_path.get(b[pos])
+        if rule is None:
+            match = token_re.match(b, pos, end)
+            if match is None:
+                raise rply.LexingError(
+                    None, SourcePosition(pos, lineno, pos - line_start + 1),
+                )
+            name, stop = match.lastgroup, match.end()
+            if name == "INTEGER_ARRAY" and not _is_value(
+                    b, start, pos, b" \t", b"=,["):
+                name, stop = "OPEN_BRACKET", pos + 1
+
+            # Decoding each token strictly means that we still validate the
+            # whole document, but we have to report where things went wrong
+            # in terms of the entire document rather than just this token.
+            try:
+                value = str(b[pos:stop], "utf8")
+            except UnicodeDecodeError as exc:
+                raise UnicodeDecodeError(
+                    exc.encoding, b, pos + exc.start, pos + exc.end,
+                    exc.reason,
+                )
+        else:
+            name, value, pattern = rule
+            if pattern is None:
+                stop = pos + 1
+            else:
+                # The only patterns on the fast path are for whitespace and
+                # bare keys, which are always ASCII.
+                stop = pattern.match(b, pos, end).end()
+                value = str(b[pos:stop], "ascii")
+
+        yield Token(
+            name, value, SourcePosition(pos, lineno, pos - line_start + 1),
+        )
+
+        if name in _multiline_tokens:
+            newlines = value.count("\n")
+            if newlines:
+                # Source positions are in bytes, so we need to know how many
+                # bytes come after the last new line to find where it starts.
+                tail = value[value.rindex("\n") + 1:]
+                lineno += newlines
+                line_start = stop - len(tail.encode("utf8"))
+
+        pos = stop
+
+
+# The most characters past the end of a token that any of our rules will look
+# at before deciding on a match, which is an escape like \U0001F600 inside of
+# a string.
+_max_lookahead = 10
+
+
+def lex_file(fp, chunk_size=64 * 1024):
+    # Lexes a file object (or anything else with a read() method, such as a
+    # mmap) incrementally, only holding onto a small buffer of the document
+    # rather than the entire thing. Files opened in binary mode are decoded as
+    # UTF8 as they are read.
+    decoder = codecs.getincrementaldecoder("utf8")()
+
+    buf, pos, offset, eof = "", 0, 0, False
+    lineno, line_start = 1, 0
+    newline = -1
+    consumed = 0
+
+    while True:
+        # We can only be sure what the next token is once we have the entire
+        # line that it starts on, plus anything that a rule might look at past
+        # the end of that line.
+        if newline < pos:
+            newline = buf.find("\n", pos)
+        ready = eof or (newline >= 0 and len(buf) - newline > _max_lookahead)
+
+        if ready:
+            if pos >= len(buf):
+                break
+
+            # Multiline strings are the only tokens that can span lines, so if
+            # one starts here we need to keep reading until we've found the
+            # end of it, otherwise we might match an empty string instead.
+            name, value = _match(buf, pos, len(buf))
+            if not eof and buf.startswith(('"""', "'''"), pos):
+                ready = (
+                    name in _multiline_strings
+                    and pos + len(value) <= len(buf) - _max_lookahead
+                )
+
+        if not ready:
+            # Reading at least as much as we already have buffered means that
+            # even a huge multiline string only takes O(log n) reads to find.
+            raw = fp.read(max(chunk_size, len(buf) - pos))
+            eof = not raw
+            if isinstance(raw, six.text_type):
+                chunk = raw
+            else:
+                # The decoder only knows about the bytes that it's been given
+                # in this call (plus any it held onto from the last one), so we
+                # have to report where things went wrong in terms of the entire
+                # document ourselves. We never hold onto the entire document,
+                # so the error only has the bytes that we were decoding.
+                pending = decoder.getstate()[0]
+                try:
+                    chunk = decoder.decode(raw, final=eof)
+                except UnicodeDecodeError as exc:
+                    start = consumed - len(pending)
+                    raise UnicodeDecodeError(
+                        exc.encoding, pending + raw, start + exc.start,
+                        start + exc.end, exc.reason,
+                    )
+                consumed += len(raw)
+
+            # Drop everything that we've already lexed from our buffer.
+            buf, offset = buf[pos:] + chunk, offset + pos
+            pos, newline = 0, -1
+            continue
+
+        idx = offset + pos
+        if name is None:
+            raise rply.LexingError(
+                None, SourcePosition(idx, lineno, idx - line_start + 1),
+            )
+
+        yield Token(
+            name, value, SourcePosition(idx, lineno, idx - line_start + 1),
+        )
+
+        if name in _multiline_tokens:
+            newlines = value.count("\n")
+            if newlines:
+                lineno += newlines
+                line_start = idx + value.rindex("\n") + 1
+
+        pos += len(value)
+
+
+def attach_trivia(tokens):
+    # Rather than making the grammar deal with whitespace and comments that can
+    # show up between any two tokens, we attach them to the token that follows
+    # them as "leading" trivia, so the parser only ever sees significant
+    # tokens. Any trivia at the very end of the document has no token to
+    # follow it, so it instead gets attached as "trailing" trivia to the last
+    # significant token, which means we have to hold onto each token until we
+    # know what comes after it.
+    trivia = []
+    previous = None
+    for token in tokens:
+        if token.name in _trivia_tokens:
+            trivia.append(token)
+            continue
+
+        if trivia:
+            token.leading, trivia = tuple(trivia), []
+
+        if previous is not None:
+            yield previous
+        previous = token
+
+    if previous is not None:
+        previous.trailing = tuple(trivia)
+        yield previous
+
+
+# Finding the table headers in a document doesn't require lexing all of it, we
+# only need to skip over anything that could contain something that looks like
+# a table header, which means strings and comments.
+_rule_patterns = dict(_rules)
+_table_scan_re = re.compile(
+    "|".join([
+        _rule_patterns["MULTILINE_BASIC_STRING"],
+        _rule_patterns["BASIC_STRING"],
+        _rule_patterns["MULTILINE_LITERAL_STRING"],
+        _rule_patterns["LITERAL_STRING"],
+        r"#[^\n]*",
+        r"^(?P<header>[ \t]*\[)",
+    ]),
+    re.MULTILINE,
+)
+_table_header_re = re.compile(
+    r"[ \t]*\[[ \t]*({0}(?:[ \t]*\.[ \t]*{0})*)[ \t]*\]".format(_BARE_KEY)
+)
+
+
+def scan_tables(s):
+    # Yields the offset of the line that each table header starts on, along
+    # with the name of that table. A header that we can't make sense of gets a
+    # name of None, the parser will be able to give a proper error for it.
+    for match in _table_scan_re.finditer(s):
+        if match.group("header") is None:
+            continue
+
+        start = match.start()
+        header = _table_header_re.match(s, start)
+        if header is None:
+            yield start, None
+        else:
+            yield start, tuple(
+                part.strip(" \t") for part in header.group(1).split(".")
+            )
@@ -1,15 +1,50 @@
 import datetime
+import re
+from json.decoder import scanstring
 
-import anytree
+from ._utils import Builder, is_not_noise
 
-from ._utils import is_not_noise, merge
 
+class Node(object):
+    # A TOML document can easily end up with more nodes than it has bytes of
+    # source, so every node class uses __slots__ to avoid carrying around a
+    # __dict__, and nodes only track their parent and (for ContainerNodes) a
+    # plain list of their children. Any subclass that doesn't declare its own
+    # __slots__ will silently gain a __dict__ again.
+    __slots__ = ("_parent",)
 
-class Node(anytree.NodeMixin):
+    # Only ContainerNodes are able to have children.
+    children = ()
+
+    # Noise nodes are those that only exist to preserve the formatting of the
+    # document, and which have no bearing on the values it compiles to.
+    noise = False
+
+    def __init__(self):
+        self._parent = None
+
+    @property
+    def parent(self):
+        return self._parent
+
+    @parent.setter
+    def parent(self, parent):
+        if self._parent is not None:
+            self._parent.children.remove(self)
+            self._parent.changed()
+        if parent is not None:
+            parent.children.append(self)
+            if parent._rendered is not None:
+                parent.changed()
+        self._parent = parent
 
     def __repr__(self):
         return "{}()".format(self.__class__.__name__)
 
+    def build(self, builder):
+        raise NotImplementedError(
+            "{} does not implement build.".format(self.__class__.__name__))
+
     def compile(self):
         raise NotImplementedError(
             "{} does not implement compile.".format(self.__class__.__name__))
@@ -20,44 +55,111 @@ class Node(anytree.NodeMixin):
 
 
 class ContainerNode(Node):
-    # While all nodes can *technically* contain other nodes, a ContainerNode
-    # contains additional functionality that makes it much easier to work with
-    # a node whose only purpose is to act as a container.
+    # A ContainerNode is a node whose only purpose is to act as a container for
+    # other nodes, holding them in the order they appear in the document.
+    #
+    # Each container remembers what it last rendered to, so that rendering a
+    # document again after changing a small part of it only has to render the
+    # containers along the path to whatever was changed. Anything that changes
+    # the children of a container directly has to call changed() afterwards.
+
+    __slots__ = ("children", "_rendered")
+
+    def __init__(self):
+        super(ContainerNode, self).__init__()
+        self.children = []
+        self._rendered = None
+
+    def changed(self):
+        # Whenever a container's rendered text is out of date, so is the text
+        # of every container above it. Since rendering a container renders
+        # everything below it, if this container is already out of date then
+        # so is everything above it, and we can stop early.
+        node = self
+        while node is not None and node._rendered is not None:
+            node._rendered = None
+            node = node._parent
+
+    def splice(self, start, stop, nodes):
+        # Replace the children from start to stop with the given nodes all at
+        # once, since attaching them one at a time can only ever append them.
+        for node in self.children[start:stop]:
+            node._parent = None
+        for node in nodes:
+            if node._parent is not None:
+                node._parent.children.remove(node)
+                node._parent.changed()
+            node._parent = self
+        self.children[start:stop] = nodes
+        self.changed()
 
     def render(self):
-        output = []
-        for node in self.children:
-            output.append(node.render())
-        return "".join(output)
+        if self._rendered is None:
+            self._rendered = "".join([node.render() for node in self.children])
+        return self._rendered
 
 
 class ContentNode(Node):
-    # ContentNodes do not contain other nodes (even though they technically
-    # have the ability to do so), instead they hold onto a chunk of content
-    # that originally came from our parsed TOML document.
+    # ContentNodes do not contain other nodes, instead they hold onto a chunk
+    # of content that originally came from our parsed TOML document.
+
+    __slots__ = ("_content",)
 
-    def __init__(self, content, **kwargs):
-        self.content = content
-        return super(ContentNode, self).__init__(**kwargs)
+    def __init__(self, content):
+        super(ContentNode, self).__init__()
+        self._content = content
 
     def __repr__(self):
         return "{}(content={!r})".format(self.__class__.__name__, self.content)
 
+    @property
+    def content(self):
+        return self._content
+
+    @content.setter
+    def content(self, content):
+        self._content = content
+        if self._parent is not None:
+            self._parent.changed()
+
+    # Turning a piece of content into its value doesn't actually require the
+    # node itself, which lets us compile values straight from the lexed
+    # tokens without building any nodes when we don't need them.
+    @classmethod
+    def decode(cls, content):
+        raise NotImplementedError(
+            "{} does not implement compile.".format(cls.__name__))
+
+    def compile(self):
+        return self.decode(self._content)
+
     def render(self):
-        return self.content
+        return self._content
 
 
 class Document(ContainerNode):
 
-    def compile(self):
-        output = {}
+    __slots__ = ()
+
+    def build(self, builder):
         for node in filter(is_not_noise, self.children):
-            output = merge(output, node.compile())
-        return output
+            node.build(builder)
+
+    def compile(self):
+        builder = Builder()
+        self.build(builder)
+        return builder.output
 
 
 class ValueStatement(ContainerNode):
 
+    __slots__ = ()
+
+    def build(self, builder):
+        key, op, value = filter(is_not_noise, self.children)
+        assert isinstance(op, Assignment)
+        builder.add(key.compile(), value.compile())
+
     def compile(self):
         key, op, value = filter(is_not_noise, self.children)
         assert isinstance(op, Assignment)
@@ -66,6 +168,8 @@ class ValueStatement(ContainerNode):
 
 class TableName(ContainerNode):
 
+    __slots__ = ()
+
     def compile(self):
         children = list(filter(is_not_noise, self.children))
         openb, name_parts, closeb = children[0], children[1:-1], children[-1]
@@ -78,109 +182,208 @@ class TableName(ContainerNode):
 
 class Table(ContainerNode):
 
-    def compile(self):
-        output = {}
+    __slots__ = ()
 
+    def build(self, builder):
         # The very first item in our children should *always* be a TableName
         # node.
         assert isinstance(self.children[0], TableName)
-        name = self.children[0].compile()
-
-        # Go through all of the names and generate our dictionary values as
-        # well as get the "current" (e.g. the one we're currently acting on")
-        # dictionary.
-        current, previous = output, None
-        for level in name:
-            previous = current
-            current[level] = current = {}
-
-        # Now that we have our current dictionary, we can go through the rest
-        # of the children and compile them.
+        builder.table(self.children[0].compile())
+
+        # Now that our table has been defined, everything else within it gets
+        # added to it.
         for node in filter(is_not_noise, self.children[1:]):
-            previous[level] = merge(previous[level], node.compile())
+            node.build(builder)
 
-        return output
+    def compile(self):
+        builder = Builder()
+        self.build(builder)
+        return builder.output
 
 
 class Array(ContainerNode):
 
+    __slots__ = ()
+
     def compile(self):
-        assert isinstance(self.children[0], OpenBracket)
-        assert isinstance(self.children[-1], CloseBracket)
-        return [n.compile() for n in filter(is_not_noise, self.children[1:-1])]
+        children = list(filter(is_not_noise, self.children))
+        openb, values, closeb = children[0], children[1:-1], children[-1]
+
+        assert isinstance(openb, OpenBracket)
+        assert isinstance(closeb, CloseBracket)
+
+        return [n.compile() for n in values]
 
 
 class LineEnd(ContentNode):
-    pass
+    __slots__ = ()
+    noise = True
 
 
 class Whitespace(ContentNode):
-    pass
+    __slots__ = ()
+    noise = True
 
 
 class Comment(ContentNode):
-    pass
+    __slots__ = ()
+    noise = True
 
 
 class OpenBracket(ContentNode):
-    pass
+    __slots__ = ()
 
 
 class CloseBracket(ContentNode):
-    pass
+    __slots__ = ()
 
 
 class Comma(ContentNode):
-    pass
+    __slots__ = ()
+    noise = True
 
 
 class Dot(ContentNode):
-    pass
+    __slots__ = ()
+    noise = True
 
 
 class BareKey(ContentNode):
 
-    def compile(self):
-        return self.content
+    __slots__ = ()
+
+    @staticmethod
+    def decode(content):
+        return content
 
 
 class Assignment(ContentNode):
-    pass
+    __slots__ = ()
+
+
+_escapes = {
+    "b": "\b", "t": "\t", "n": "\n", "f": "\f", "r": "\r", '"': '"',
+    "\\": "\\",
+}
+_escape_re = re.compile(
+    r'\\(?:([btnfr"\\])|u([0-9a-fA-F]{4})|U([0-9a-fA-F]{8}))'
+)
+_surrogate_re = re.compile(r"\\u[dD][89abAB]")
+
+
+def _unescape(match):
+    char, short, long_ = match.groups()
+    if char is not None:
+        return _escapes[char]
+
+    # The lexer has already checked the shape of every escape, but not that
+    # it's for a valid unicode scalar value.
+    codepoint = int(short or long_, 16)
+    if 0xD800 <= codepoint <= 0xDFFF or codepoint > 0x10FFFF:
+        raise ValueError(
+            "Invalid unicode escape: {}".format(match.group())
+        )
+    return chr(codepoint)
 
 
 class BasicString(ContentNode):
 
-    def compile(self):
-        # TODO: How do I actually complile a string? HALP.
-        return self.content[1:-1]
+    __slots__ = ()
+
+    @staticmethod
+    def decode(content):
+        # Most strings don't have any escapes in them at all, so it's worth
+        # checking before we go looking for them.
+        if "\\" not in content:
+            return content[1:-1]
+
+        # The escapes in a basic string are the same as in a JSON string, other
+        # than \U (which JSON doesn't have) and surrogates (which TOML doesn't
+        # allow), so unless one of those shows up, we can have the JSON
+        # decoder's C implementation do the work for us.
+        if "\\U" not in content and not _surrogate_re.search(content):
+            return scanstring(content, 1)[0]
+        return _escape_re.sub(_unescape, content[1:-1])
 
 
 class LiteralString(ContentNode):
 
-    def compile(self):
+    __slots__ = ()
+
+    @staticmethod
+    def decode(content):
         # TODO: Learn 2 compile
-        return self.content[1:-1]
+        return content[1:-1]
 
 
 class Integer(ContentNode):
 
-    def compile(self):
-        return int(self.content)
+    __slots__ = ()
+
+    @staticmethod
+    def decode(content):
+        return int(content)
+
+
+class IntegerArray(ContentNode):
+    # An entire array of integers, which the lexer only produces as a single
+    # token when asked to.
+
+    __slots__ = ()
+
+    @staticmethod
+    def decode(content):
+        return [int(value) for value in content[1:-1].split(",")]
 
 
 class Boolean(ContentNode):
 
-    def compile(self):
-        return {"true": True, "false": False}[self.content]
+    __slots__ = ()
+
+    @staticmethod
+    def decode(content):
+        return {"true": True, "false": False}[content]
+
+
+# There are only so many different offsets that show up in practice, so rather
+# than creating a new tzinfo for every datetime, we share them.
+_timezones = {"Z": datetime.timezone.utc}
+
+
+def _timezone(offset):
+    try:
+        return _timezones[offset]
+    except KeyError:
+        pass
+
+    minutes = int(offset[1:3]) * 60 + int(offset[4:6])
+    if offset[0] == "-":
+        minutes = -minutes
+    if minutes:
+        tz = datetime.timezone(datetime.timedelta(minutes=minutes))
+    else:
+        tz = datetime.timezone.utc
+    _timezones[offset] = tz
+    return tz
 
 
 class OffsetDateTime(ContentNode):
 
-    def compile(self):
-        if self.content.endswith("Z"):
-            return datetime.datetime.strptime(
-                self.content, "%Y-%m-%dT%H:%M:%SZ")
-        else:
-            assert self.content[-3] == ":"
-            content = self.content[:-3] + self.content[-2:]
-            return datetime.datetime.strptime(content, "%Y-%m-%dT%H:%M:%S%z")
+    __slots__ = ()
+
+    @staticmethod
+    def decode(content):
+        # The lexer has already made sure that this looks like
+        # YYYY-MM-DDTHH:MM:SS, optionally followed by fractional seconds, then
+        # either a Z or a +HH:MM offset, so we can just pick it apart, and
+        # leave checking that each field is in range to datetime.
+        end, microsecond = 19, 0
+        if content[19] == ".":
+            end = len(content) - (1 if content[-1] == "Z" else 6)
+            microsecond = int(content[20:end][:6].ljust(6, "0"))
+
+        return datetime.datetime(
+            int(content[0:4]), int(content[5:7]), int(content[8:10]),
+            int(content[11:13]), int(content[14:16]), int(content[17:19]),
+            microsecond, _timezone(content[end:]),
+        )
@@ -1,13 +1,18 @@
+import array
+import os
+
 import rply
 import rply.errors
+import rply.parsergenerator
 
+from ._lexer import _trivia_tokens, attach_trivia, lex, scan_tables
 from ._nodes import Array, Document, Table, TableName, ValueStatement
 from ._nodes import (
-    Assignment, BareKey, BasicString, Comment, LineEnd, Node, Whitespace,
-    OpenBracket, CloseBracket, OffsetDateTime, Integer, Boolean, Comma, Dot,
-    LiteralString,
+    Assignment, BareKey, BasicString, Comment, LineEnd, Whitespace,
+    OpenBracket, CloseBracket, OffsetDateTime, Integer, IntegerArray, Boolean,
+    Comma, Dot, LiteralString,
 )
-from ._utils import with_whitespace
+from ._utils import Builder, LocationIndex
 
 
 _token_to_node = {
@@ -17,99 +22,105 @@ _token_to_node = {
     "LITERAL_STRING": LiteralString,
     "BOOLEAN": Boolean,
     "INTEGER": Integer,
+    "INTEGER_ARRAY": IntegerArray,
     "OFFSET_DATETIME": OffsetDateTime,
-    "COMMENT": Comment,
     "LINE_END": LineEnd,
-    "WHITESPACE": Whitespace,
     "OPEN_BRACKET": OpenBracket,
     "CLOSE_BRACKET": CloseBracket,
     "COMMA": Comma,
     "PERIOD": Dot,
 }
 
+# Whitespace and comments never make it to the parser itself, they are
+# attached to the significant tokens around them as trivia.
+_trivia_to_node = {
+    "COMMENT": Comment,
+    "WHITESPACE": Whitespace,
+}
+
+# Our lexer can't tell an integer from a bare key made up of digits, so when
+# an INTEGER shows up as a key we treat it as a BareKey instead.
+_key_token_to_node = dict(_token_to_node, INTEGER=BareKey)
+
+
+class _ParserGenerator(rply.ParserGenerator):
+
+    def __init__(self, *args, **kwargs):
+        super(_ParserGenerator, self).__init__(*args, **kwargs)
+        self.cache_file = None
+
+    def compute_grammar_hash(self, g):
+        # rply names the cache file after a hash of the grammar, which it only
+        # computes within build(), right before reading the cache. We hold
+        # onto that name so that if the file can't be read, we know which
+        # file to remove.
+        grammar_hash = super(_ParserGenerator, self).compute_grammar_hash(g)
+        self.cache_file = os.path.join(
+            rply.parsergenerator.AppDirs("rply").user_cache_dir,
+            "{}-{}-{}.json".format(self.cache_id, self.VERSION, grammar_hash),
+        )
+        return grammar_hash
+
+    def _write_cache(self, cache_dir, cache_file, table):
+        # By the time the cache is written, the tables have already been
+        # generated, so if it can't be written (a read only home directory,
+        # etc) we just carry on without it.
+        try:
+            super(_ParserGenerator, self)._write_cache(
+                cache_dir, cache_file, table,
+            )
+        except EnvironmentError:
+            pass
+
+
+_pg = _ParserGenerator(_token_to_node.keys(), cache_id="toml")
 
-_pg = rply.ParserGenerator(_token_to_node.keys())
+
+# The productions themselves only describe the grammar, what actually happens
+# when one of them is reduced is up to the state object that was passed into
+# parse(), which lets us use the same grammar (and the same parse tables) to
+# do things like building a FST or compiling values directly.
 
 
 @_pg.production("toml : statements")
 def toml(state, pack):
-    statements, = pack
-
-    # Build our final Document up, correctly parenting items to the root of the
-    # document or within the last Table.
-    root = Document()
-    table = None
-    for statement in statements:
-        # Table instances always are children of the root node, but we also
-        # need to record whatever the last Table instance we saw was.
-        if isinstance(statement, Table):
-            table = statement
-            table.parent = root
-        # If we had not yet gotten a Table, then everything we see is a child
-        # of the root node.
-        elif table is None:
-            statement.parent = root
-        # Finally, if we've gotten a table at some point, then everything from
-        # that point on (except for other Table instances!) are children of the
-        # most recent Table node.
-        else:
-            statement.parent = table
-
-    return root
-
-
-@with_whitespace(_pg, "statements : statements statement")
+    return state.toml()
+
+
+@_pg.production("statements : statements statement")
 def statements_statement(state, pack):
-    statements = pack[0]
-    whitespace = [_token_to_node[p.name](content=p.value) for p in pack[1:-1]]
-    statement = pack[-1]
-    return statements + whitespace + statement
+    statements, statement = pack
+    state.add_statement(statement)
 
 
 @_pg.production("statements : statement")
 def statement(state, pack):
     statement_, = pack
-    return statement_
+    state.add_statement(statement_)
 
 
 @_pg.production("statement : line_end")
 def statement_line_end(state, pack):
     line_end, = pack
-    return line_end
+    return state.statement_line_end(line_end)
 
 
-@with_whitespace(_pg, "statement : value_stmt line_end")
+@_pg.production("statement : value_stmt line_end")
 def statement_value_stmt(state, pack):
-    value_stmt = pack[0]
-    whitespace = [_token_to_node[p.name](content=p.value) for p in pack[1:-1]]
-    line_end = pack[-1]
-
-    stmt = ValueStatement()
-    for item in value_stmt:
-        item.parent = stmt
-
-    return [stmt] + whitespace + line_end
+    value_stmt, line_end = pack
+    return state.statement_value_stmt(value_stmt, line_end)
 
 
 @_pg.production("line_end : LINE_END")
 def line_end(state, pack):
-    return [_token_to_node[p.name](content=p.value) for p in pack]
-
-
-@_pg.production("line_end : COMMENT LINE_END")
-def comment(state, pack):
-    return [_token_to_node[p.name](content=p.value) for p in pack]
+    token, = pack
+    return state.line_end(token)
 
 
-@with_whitespace(_pg, "value_stmt : value_key ASSIGNMENT value_type")
+@_pg.production("value_stmt : value_key ASSIGNMENT value_type")
 def value_stmt(state, pack):
-    output = []
-    for item in pack:
-        if isinstance(item, Node):
-            output.append(item)
-        else:
-            output.append(_token_to_node[item.name](content=item.value))
-    return output
+    key, assignment, value = pack
+    return state.value_stmt(key, assignment, value)
 
 
 @_pg.production("value_key : BARE_KEY")
@@ -128,106 +139,453 @@ def value_key(state, pack):
     if token.name == "INTEGER":
         if token.value.startswith("+"):
             raise rply.ParsingError(None, token.getsourcepos())
-        return BareKey(content=token.value)
 
-    return _token_to_node[token.name](content=token.value)
+    return state.value_key(token)
 
 
 @_pg.production("value_type : BASIC_STRING")
 @_pg.production("value_type : OFFSET_DATETIME")
 @_pg.production("value_type : INTEGER")
+@_pg.production("value_type : INTEGER_ARRAY")
 @_pg.production("value_type : BOOLEAN")
 def value_type(state, pack):
     token, = pack
-    return _token_to_node[token.name](content=token.value)
+    return state.value_type(token)
+
+
+@_pg.production("value_type : OPEN_BRACKET CLOSE_BRACKET")
+def value_type_empty_array(state, pack):
+    openb, closeb = pack
+    return state.value_type_array(openb, None, closeb)
 
 
-@with_whitespace(_pg, "value_type : OPEN_BRACKET CLOSE_BRACKET")
-@with_whitespace(_pg, "value_type : OPEN_BRACKET array_values CLOSE_BRACKET")
+@_pg.production("value_type : OPEN_BRACKET array_values CLOSE_BRACKET")
 def value_type_array(state, pack):
-    array = Array()
-    for item in pack:
-        if isinstance(item, Node):
-            item.parent = array
-        elif isinstance(item, list):
-            for sitem in item:
-                sitem.parent = array
-        else:
-            _token_to_node[item.name](content=item.value).parent = array
-    return array
+    openb, values, closeb = pack
+    return state.value_type_array(openb, values, closeb)
 
 
-@with_whitespace(_pg, "array_values : array_values COMMA value_type")
-@with_whitespace(_pg, "array_values : value_type")
+@_pg.production("array_values : array_values COMMA value_type")
 def array_values(state, pack):
-    output = []
-    for item in pack:
-        if isinstance(item, Node):
-            output.append(item)
-        elif isinstance(item, list):
-            output += item
-        else:
-            output.append(_token_to_node[item.name](content=item.value))
-    return output
-
-
-@with_whitespace(_pg, "statement : table_def line_end")
-def statement_table_def(state, pack):
-    table_def = pack[0]
-    whitespace = [_token_to_node[p.name](content=p.value) for p in pack[1:-1]]
-    line_end = pack[-1]
-
-    table = Table()
-    table_name = TableName()
-    for item in table_def:
-        if isinstance(item, list):
-            for sitem in item:
-                sitem.parent = table_name
-        else:
-            item.parent = table_name
+    values, comma, value = pack
+    return state.array_values(values, comma, value)
 
-    for item in ([table_name] + whitespace + line_end):
-        item.parent = table
 
-    return [table]
+@_pg.production("array_values : value_type")
+def array_value(state, pack):
+    value, = pack
+    return state.array_value(value)
 
 
-@with_whitespace(_pg, "table_def : OPEN_BRACKET table_names CLOSE_BRACKET")
-def table_def(state, pack):
-    output = []
-    for item in pack:
-        if isinstance(item, list):
-            output += item
-        else:
-            output.append(_token_to_node[item.name](content=item.value))
+@_pg.production("statement : table_def line_end")
+def statement_table_def(state, pack):
+    table_def, line_end = pack
+    return state.statement_table_def(table_def, line_end)
 
-    return output
+
+@_pg.production("table_def : OPEN_BRACKET table_names CLOSE_BRACKET")
+def table_def(state, pack):
+    openb, names, closeb = pack
+    return state.table_def(openb, names, closeb)
 
 
-@with_whitespace(_pg, "table_names : table_names PERIOD table_name")
-@with_whitespace(_pg, "table_names : table_name")
+@_pg.production("table_names : table_names PERIOD table_name")
 def table_names(state, pack):
-    output = []
-    for item in pack:
-        if isinstance(item, list):
-            output += item
-        else:
-            output.append(_token_to_node[item.name](content=item.value))
+    names, period, name = pack
+    return state.table_names(names, period, name)
 
-    return output
+
+@_pg.production("table_names : table_name")
+def table_names_name(state, pack):
+    name, = pack
+    return name
 
 
 @_pg.production("table_name : BARE_KEY")
 def table_def_name(state, pack):
-    return [_token_to_node[p.name](content=p.value) for p in pack]
+    token, = pack
+    return state.table_name(token)
+
+
+def _remove_cache(pg):
+    # Removes the cache file for our current grammar, leaving alone any that
+    # other versions of toml (or other environments) have cached.
+    if pg.cache_file is None:
+        return
+    try:
+        os.remove(pg.cache_file)
+    except EnvironmentError:
+        pass
+
+
+def _build_parser(pg):
+    # Generating the LALR tables is the most expensive part of importing toml,
+    # so we let rply cache them on disk. The cache is keyed by a hash of our
+    # grammar, so any change to the grammar will cause the tables to be
+    # regenerated. However, the cache is purely an optimization, so if it can't
+    # be written then we'll just use the tables that were generated, and if it
+    # can't be read (a corrupted file, etc) then we remove it and generate
+    # the tables again, which will replace it. If all else fails, we generate
+    # the tables without the cache at all.
+    try:
+        return pg.build()
+    except (EnvironmentError, ValueError, KeyError, TypeError):
+        _remove_cache(pg)
+
+    try:
+        return pg.build()
+    except (EnvironmentError, ValueError, KeyError, TypeError):
+        cache_id, pg.cache_id = pg.cache_id, None
+        try:
+            return pg.build()
+        finally:
+            pg.cache_id = cache_id
+
+
+_parser = _build_parser(_pg)
+
+
+def _nodes(token, node_class=None):
+    # Turn a token into its node, along with the nodes for any trivia that has
+    # been attached to it, in the order that they appeared in the document.
+    if node_class is None:
+        node_class = _token_to_node[token.name]
+
+    nodes = [_trivia_to_node[t.name](content=t.value) for t in token.leading]
+    nodes.append(node_class(content=token.value))
+    nodes.extend(
+        _trivia_to_node[t.name](content=t.value) for t in token.trailing
+    )
+    return nodes
+
 
+class ParserState:
+    # Builds up a FST of our document, which holds onto every last bit of the
+    # original document, including its formatting. Everything smaller than a
+    # complete statement is passed around as a list of nodes.
+
+    def __init__(self):
+        self.document = Document()
+
+        # How many nodes we've created, which is the size of the FST once the
+        # whole document has been parsed.
+        self.nodes = 1
+
+        # Statements belong to the most recent Table that we've seen, or to
+        # the Document itself if we haven't seen any Table yet.
+        self.container = self.document
+
+    def toml(self):
+        return self.document
+
+    def _nodes(self, token, node_class=None):
+        nodes = _nodes(token, node_class)
+        self.nodes += len(nodes)
+        return nodes
+
+    def add_statement(self, statement):
+        # We attach each statement to the Document as soon as it has been
+        # reduced, rather than collecting all of them and attaching them at the
+        # end, which would mean copying the list of statements each time we
+        # reduced another one.
+        for node in statement:
+            # Table instances always are children of the root node, and
+            # everything from that point on (except for other Table instances!)
+            # are children of the most recent Table node.
+            if isinstance(node, Table):
+                node.parent = self.document
+                self.container = node
+            else:
+                node.parent = self.container
+
+    def statement_line_end(self, line_end):
+        return line_end
+
+    def statement_value_stmt(self, value_stmt, line_end):
+        stmt = ValueStatement()
+        self.nodes += 1
+        for item in value_stmt:
+            item.parent = stmt
+
+        return [stmt] + line_end
+
+    def statement_table_def(self, table_def, line_end):
+        table = Table()
+        table_name = TableName()
+        self.nodes += 2
+        for item in table_def:
+            item.parent = table_name
 
-_parser = _pg.build()
+        for item in ([table_name] + line_end):
+            item.parent = table
 
+        return [table]
 
-class ParserState:
-    pass
+    def line_end(self, token):
+        return self._nodes(token)
+
+    def value_stmt(self, key, assignment, value):
+        return key + self._nodes(assignment) + value
+
+    def value_key(self, token):
+        return self._nodes(token, _key_token_to_node[token.name])
+
+    def value_type(self, token):
+        return self._nodes(token)
+
+    def value_type_array(self, openb, values, closeb):
+        array = Array()
+        self.nodes += 1
+        items = self._nodes(openb) + (values or []) + self._nodes(closeb)
+        for item in items:
+            item.parent = array
+        return [array]
+
+    def array_values(self, values, comma, value):
+        return values + self._nodes(comma) + value
+
+    def array_value(self, value):
+        return value
+
+    def table_def(self, openb, names, closeb):
+        return self._nodes(openb) + names + self._nodes(closeb)
+
+    def table_names(self, names, period, name):
+        return names + self._nodes(period) + name
+
+    def table_name(self, token):
+        return self._nodes(token)
+
+
+def _compact_array(content):
+    # Integers in TOML are 64 bit, so they'll always fit into an array of C
+    # long longs, but we'd rather hand back a list than refuse a document
+    # that has a larger one anyway.
+    try:
+        return array.array("q", map(int, content[1:-1].split(",")))
+    except OverflowError:
+        return IntegerArray.decode(content)
+
+
+def _numpy_array(content):
+    import numpy
+
+    values = _compact_array(content)
+    if isinstance(values, list):
+        return values
+    return numpy.frombuffer(values, dtype=numpy.int64)
+
+
+_array_types = {
+    None: IntegerArray.decode,
+    "array": _compact_array,
+    "numpy": _numpy_array,
+}
+
+
+class ValueState:
+    # Compiles our document straight to Python values while it's being parsed,
+    # without ever building a FST, for when all we want are the values and the
+    # formatting of the document doesn't matter at all. Arrays of integers are
+    # compiled to lists, unless array_type asks for something more compact.
+
+    def __init__(self, array_type=None):
+        self.builder = Builder()
+        if array_type not in _array_types:
+            raise ValueError("Unknown array type: {!r}".format(array_type))
+        if array_type == "numpy":
+            # NumPy is optional, so make sure that it's actually installed up
+            # front, rather than only once we come across an array of
+            # integers, which some documents might never have.
+            import numpy  # noqa
+        self._integer_array = _array_types[array_type]
+
+    def toml(self):
+        return self.builder.output
+
+    def add_statement(self, statement):
+        pass
+
+    def statement_line_end(self, line_end):
+        pass
+
+    def statement_value_stmt(self, value_stmt, line_end):
+        key, value = value_stmt
+        self.builder.add(key, value)
+
+    def statement_table_def(self, table_def, line_end):
+        self.builder.table(table_def)
+
+    def line_end(self, token):
+        pass
+
+    def value_stmt(self, key, assignment, value):
+        return key, value
+
+    def value_key(self, token):
+        return _key_token_to_node[token.name].decode(token.value)
+
+    def value_type(self, token):
+        if token.name == "INTEGER_ARRAY":
+            return self._integer_array(token.value)
+        return _token_to_node[token.name].decode(token.value)
+
+    def value_type_array(self, openb, values, closeb):
+        return [] if values is None else values
+
+    def array_values(self, values, comma, value):
+        values.append(value)
+        return values
+
+    def array_value(self, value):
+        return [value]
+
+    def table_def(self, openb, names, closeb):
+        return names
+
+    def table_names(self, names, period, name):
+        names.extend(name)
+        return names
+
+    def table_name(self, token):
+        return [BareKey.decode(token.value)]
+
+
+def _location(first, last):
+    # The location of everything from the start of the first token through to
+    # the end of the last one, start and end are offsets into the document.
+    pos = first.getsourcepos()
+    return (
+        pos.lineno, pos.colno, pos.idx,
+        last.getsourcepos().idx + len(last.value),
+    )
+
+
+class LocationState(ValueState):
+    # Compiles our document straight to Python values just like ValueState,
+    # while also building an index of where in the document each key and
+    # table was defined, keyed by the full path to that key or table.
+
+    def __init__(self):
+        ValueState.__init__(self)
+        self.locations = LocationIndex()
+        self._name = ()
+
+        # The token that the most recently reduced value ended on, when a value
+        # statement is reduced this is the end of its (outermost) value.
+        self._last = None
+
+    def toml(self):
+        return self.builder.output, self.locations
+
+    def statement_value_stmt(self, value_stmt, line_end):
+        (key, first), value = value_stmt
+        self.builder.add(key, value)
+        self.locations.add(self._name + (key,), *_location(first, self._last))
+
+    def statement_table_def(self, table_def, line_end):
+        names, openb, closeb = table_def
+        self.builder.table(names)
+        self._name = tuple(names)
+        self.locations.add(self._name, *_location(openb, closeb))
+
+    def value_key(self, token):
+        return ValueState.value_key(self, token), token
+
+    def value_type(self, token):
+        self._last = token
+        return ValueState.value_type(self, token)
+
+    def value_type_array(self, openb, values, closeb):
+        self._last = closeb
+        return ValueState.value_type_array(self, openb, values, closeb)
+
+    def table_def(self, openb, names, closeb):
+        return names, openb, closeb
+
+
+class ValidationState:
+    # Only checks that our document is syntactically valid, none of the
+    # reductions build anything at all, so validating a document takes the
+    # same small amount of memory no matter how large the document is.
+
+    def toml(self):
+        pass
+
+    def add_statement(self, statement):
+        pass
+
+    def statement_line_end(self, line_end):
+        pass
+
+    def statement_value_stmt(self, value_stmt, line_end):
+        pass
+
+    def statement_table_def(self, table_def, line_end):
+        pass
+
+    def line_end(self, token):
+        pass
+
+    def value_stmt(self, key, assignment, value):
+        pass
+
+    def value_key(self, token):
+        pass
+
+    def value_type(self, token):
+        pass
+
+    def value_type_array(self, openb, values, closeb):
+        pass
+
+    def array_values(self, values, comma, value):
+        pass
+
+    def array_value(self, value):
+        pass
+
+    def table_def(self, openb, names, closeb):
+        pass
+
+    def table_names(self, names, period, name):
+        pass
+
+    def table_name(self, token):
+        pass
+
+
+def parse(token_stream, state=None):
+    if state is None:
+        state = ParserState()
+    return _parser.parse(attach_trivia(token_stream), state=state)
+
+
+def table_sections(data):
+    # Splits a document into its sections without parsing it, by scanning for
+    # table headers, yielding the name, start, and end of each. Each table is
+    # defined by everything from its header to the next one, and the root
+    # table (named ()) by everything before the first header, so each section
+    # is a valid TOML document all on its own.
+    headers = list(scan_tables(data))
+    ends = [start for start, name in headers] + [len(data)]
+    yield (), 0, ends[0]
+
+    for (start, name), end in zip(headers, ends[1:]):
+        # If we weren't able to figure out what the name of the table was, then
+        # this isn't a valid table header, so we'll let the parser tell us
+        # what is actually wrong with it.
+        if name is None:
+            parse(lex(data, start, end), ValueState())
+            raise ValueError("Invalid table header.")
+        yield name, start, end
 
 
-def parse(token_stream):
-    return _parser.parse(token_stream, state=ParserState())
+def validate(token_stream):
+    # When all we want to know is whether a document is valid, we have no use
+    # for any of the trivia, so rather than attaching it to the tokens around
+    # it, we can just throw it away.
+    _parser.parse(
+        (t for t in token_stream if t.name not in _trivia_tokens),
+        state=ValidationState(),
+    )
@@ -0,0 +1,88 @@
+import six
+
+from . import _lexer, _parser
+from ._utils import Builder
+
+
+def _path(path):
+    # Paths can either be given as a sequence of keys, or as a single string
+    # of bare keys separated by dots.
+    if isinstance(path, six.string_types):
+        path = path.split(".")
+    path = tuple(path)
+    if not path:
+        raise ValueError("Cannot select the root table.")
+    return path
+
+
+def _wanted(name, paths):
+    # A table might hold part of what we're after if it is within one of our
+    # paths, or if one of our paths is within it.
+    for path in paths:
+        if name[:len(path)] == path or path[:len(name)] == name:
+            return True
+    return False
+
+
+def _project(values, paths):
+    # Copy just the parts of values that are at one of our paths, along with
+    # the tables that lead to them, into a new set of values.
+    output = {}
+    for path in paths:
+        value = values
+        for part in path:
+            if not isinstance(value, dict) or part not in value:
+                break
+            value = value[part]
+        else:
+            target = output
+            for part in path[:-1]:
+                target = target.setdefault(part, {})
+            target[path[-1]] = value
+    return output
+
+
+def _sections(data, paths):
+    return [
+        (name, start, end)
+        for name, start, end in _parser.table_sections(data)
+        if not name or _wanted(name, paths)
+    ]
+
+
+def load(data, paths, array_type=None, stats=None):
+    # Loads only the parts of the document at the given paths. We use the
+    # index of table headers to find the tables that could possibly have
+    # anything that we want in them, and only those tables (along with the
+    # root table, which could have anything in it) get lexed and parsed, the
+    # rest of the document is skipped over entirely.
+    if isinstance(paths, six.string_types):
+        paths = [paths]
+    paths = [_path(path) for path in paths]
+
+    if stats is None:
+        sections = _sections(data, paths)
+        parse = _parser.parse
+    else:
+        with stats.timed("scan"):
+            sections = _sections(data, paths)
+        parse = stats.parse_section
+
+    # Each section can be parsed on its own, so we parse each of them
+    # separately and then put them back together, letting the Builder catch
+    # any duplicated keys or tables between them.
+    builder = Builder()
+    for name, start, end in sections:
+        if start == end:
+            continue
+        values = parse(
+            _lexer.lex(data, start, end, array_type is not None),
+            _parser.ValueState(array_type),
+        )
+        for part in name:
+            values = values[part]
+        if name:
+            builder.table(name)
+        builder.update(values)
+
+    return _project(builder.output, paths)
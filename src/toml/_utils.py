@@ -1,55 +1,100 @@
+import array
 import collections
-import copy
-import itertools
 
 try:
-    from itertools import zip_longest
+    from collections.abc import Mapping
 except ImportError:
-    from itertools import izip_longest as zip_longest
+    from collections import Mapping
 
 
 def is_not_noise(node):
-    from ._nodes import Whitespace, Comment, LineEnd, Dot, Comma
-    return not isinstance(node, (Whitespace, Comment, LineEnd, Dot, Comma))
-
-
-def merge(to, from_):
-    output = copy.deepcopy(to)
-    for key, value in from_.items():
-        if (isinstance(output.get(key), collections.MutableMapping)
-                and isinstance(value, collections.MutableMapping)):
-            value = merge(output[key], value)
-        output[key] = value
-    return output
-
-
-def with_whitespace(pg, format_):
-    left, right = format_.split(" : ", 1)
-    tokens = right.split()
-
-    # We need to take our right side tokens, and expand them into a list of
-    # tokens that exhaustively list all possible combinations with and without
-    # whitespace. If we have less than two tokens on the right hand side, then
-    # this expansion is just the same as the format that was passed in since
-    # without at least two tokens there is no place to insert whitespace.
-    if len(tokens) < 2:
-        expanded = [format_]
-    else:
-        expanded = []
-        for pat in itertools.product([True, False], repeat=len(tokens) - 1):
-            row = []
-            for token, use_ws in zip_longest(tokens, pat, fillvalue=None):
-                row.append(token)
-                if use_ws:
-                    row.append("WHITESPACE")
-            expanded.append("{} : {}".format(left, " ".join(row)))
-
-    # Now, make a decorator that, when called, will call our pg_production
-    # function for each value in our expanded list to generate every possible
-    # set of rules for whitespace with the given format string.
-    def deco(fn):
-        for format_ in expanded:
-            fn = pg.production(format_)(fn)
-        return fn
-
-    return deco
+    return not node.noise
+
+
+class Builder(object):
+    # Accumulates the compiled values of a document in place, rather than
+    # compiling each statement to its own dictionary and merging them
+    # together, which would mean copying everything we've compiled so far for
+    # every statement. While doing so, it keeps track of enough information to
+    # detect keys and tables that have been defined more than once.
+    #
+    # The same keys tend to show up over and over again throughout a document,
+    # so we intern them, so that each key is only held onto once no matter
+    # how many tables it's in.
+
+    def __init__(self):
+        self.output = {}
+        self._table = self.output
+        self._name = ()
+        self._defined = set()
+        self._keys = {}
+
+    def table(self, name):
+        name = tuple(name)
+        if name in self._defined:
+            raise ValueError(
+                "Duplicate table: {}".format(".".join(name))
+            )
+
+        # Walk down to the table that we're defining, implicitly creating any
+        # of the tables above it that haven't already been defined.
+        keys = self._keys
+        current = self.output
+        for i, part in enumerate(name):
+            part = keys.setdefault(part, part)
+            current = current.setdefault(part, {})
+            if not isinstance(current, dict):
+                raise ValueError(
+                    "Cannot define table {}, {} is not a table.".format(
+                        ".".join(name), ".".join(name[:i + 1]),
+                    )
+                )
+
+        self._defined.add(name)
+        self._table, self._name = current, name
+
+    def add(self, key, value):
+        if key in self._table:
+            raise ValueError(
+                "Duplicate key: {}".format(".".join(self._name + (key,)))
+            )
+        self._table[self._keys.setdefault(key, key)] = value
+
+    def update(self, values):
+        # Adds every key from values at once, which is much faster than adding
+        # them one at a time when there's no chance of them being duplicated.
+        if not self._table.keys().isdisjoint(values):
+            for key in values:
+                if key in self._table:
+                    self.add(key, values[key])
+        self._table.update(values)
+
+
+Location = collections.namedtuple(
+    "Location", ["line", "column", "start", "end"],
+)
+
+
+class LocationIndex(Mapping):
+    # A read only mapping of paths to the Location of each key and table in a
+    # document. There's one of these for every key, so rather than holding
+    # onto a Location object for each of them, we pack them all into a single
+    # array and only create the Location when it's looked up.
+
+    def __init__(self):
+        self._paths = {}
+        self._locations = array.array("l")
+
+    def add(self, path, line, column, start, end):
+        self._paths[path] = len(self._paths)
+        self._locations.extend((line, column, start, end))
+
+    def __getitem__(self, path):
+        i = self._paths[path] * 4
+        return Location(*self._locations[i:i + 4])
+
+    def __iter__(self):
+        return iter(self._paths)
+
+    def __len__(self):
+        return len(self._paths)
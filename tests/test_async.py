@@ -0,0 +1,91 @@
+import asyncio
+import concurrent.futures
+import subprocess
+import sys
+
+import pytest
+import rply
+
+import toml
+
+
+_DOCUMENT = "".join(
+    '[t{0}]\nname = "é {0}"\nn = [{0}, 1]\n\n'.format(i) for i in range(50)
+)
+
+
+@pytest.mark.parametrize("yield_every", [None, 1, 7, 1000])
+@pytest.mark.parametrize("encode", [False, True])
+def test_aloads(yield_every, encode):
+    data = _DOCUMENT.encode("utf8") if encode else _DOCUMENT
+
+    result = asyncio.run(toml.aloads(data, yield_every=yield_every))
+
+    assert result == toml.loads(_DOCUMENT)
+
+
+@pytest.mark.parametrize("yield_every", [None, 10])
+def test_aload(tmpdir, yield_every):
+    path = tmpdir.join("a.toml")
+    path.write_binary(_DOCUMENT.encode("utf8"))
+
+    with concurrent.futures.ThreadPoolExecutor(1) as executor:
+        result = asyncio.run(
+            toml.aload(str(path), executor=executor, yield_every=yield_every),
+        )
+
+    assert result == toml.loads(_DOCUMENT)
+
+
+@pytest.mark.parametrize(
+    ("data", "exception"),
+    [
+        (_DOCUMENT + "[t1]\n", ValueError),
+        (_DOCUMENT + "a = = 1\n", rply.ParsingError),
+        ("", rply.ParsingError),
+    ],
+)
+@pytest.mark.parametrize("yield_every", [None, 1, 10])
+def test_aloads_errors(data, exception, yield_every):
+    with pytest.raises(exception):
+        asyncio.run(toml.aloads(data, yield_every=yield_every))
+
+
+def test_aloads_invalid_yield_every():
+    with pytest.raises(ValueError):
+        asyncio.run(toml.aloads(_DOCUMENT, yield_every=0))
+
+
+def test_aloads_yields_to_the_loop():
+    ticks = []
+
+    async def ticker():
+        while True:
+            ticks.append(None)
+            await asyncio.sleep(0)
+
+    async def main():
+        task = asyncio.ensure_future(ticker())
+        await asyncio.sleep(0)
+        await toml.aloads(_DOCUMENT, yield_every=10)
+        task.cancel()
+
+    asyncio.run(main())
+    assert len(ticks) > 50
+
+
+def test_aloads_cancel():
+    async def main():
+        task = asyncio.ensure_future(toml.aloads(_DOCUMENT, yield_every=1))
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(main())
+
+
+def test_import_does_not_import_asyncio():
+    code = "import sys, toml; assert 'asyncio' not in sys.modules"
+    subprocess.check_call([sys.executable, "-c", code])
@@ -0,0 +1,73 @@
+import pickle
+
+import pytest
+import rply
+
+import toml
+
+
+@pytest.fixture
+def paths(tmpdir):
+    paths = []
+    for i in range(20):
+        path = tmpdir.join("{}.toml".format(i))
+        path.write("a = {}\n".format(i) if i != 7 else "a = \n")
+        paths.append(str(path))
+    paths.append(str(tmpdir.join("missing.toml")))
+    return paths
+
+
+def _check(results, paths):
+    results = {result.path: result for result in results}
+    assert sorted(results) == sorted(paths)
+
+    for i, path in enumerate(paths[:-1]):
+        if i == 7:
+            assert results[path].data is None
+            assert isinstance(results[path].error, rply.ParsingError)
+        else:
+            assert results[path].data == {"a": i}
+            assert results[path].error is None
+
+    assert isinstance(results[paths[-1]].error, IOError)
+
+
+@pytest.mark.parametrize("workers", [1, 3])
+def test_load_many_ordered(paths, workers):
+    results = list(toml.load_many(paths, workers=workers, chunksize=2))
+
+    assert [result.path for result in results] == paths
+    _check(results, paths)
+
+
+def test_load_many_unordered(paths):
+    _check(toml.load_many(iter(paths), workers=2, ordered=False), paths)
+
+
+def test_load_many_threads(monkeypatch, paths):
+    monkeypatch.setattr(toml._bulk, "_free_threaded", lambda: True)
+    _check(toml.load_many(paths, workers=4), paths)
+
+
+def test_load_many_stops_early(paths):
+    results = toml.load_many(paths, workers=2)
+    assert next(results).data == {"a": 0}
+    results.close()
+
+
+def test_load_many_unpicklable_error(monkeypatch, tmpdir):
+    class UnpicklableError(Exception):
+        pass
+
+    def fail(path):
+        raise UnpicklableError(path)
+
+    monkeypatch.setattr(toml._bulk, "parse", lambda *args: fail("bad"))
+    path = tmpdir.join("a.toml")
+    path.write("a = 1\n")
+
+    result, = toml.load_many([str(path)], workers=1)
+
+    assert isinstance(result.error, RuntimeError)
+    assert str(result.error) == "UnpicklableError: bad"
+    pickle.dumps(result.error)
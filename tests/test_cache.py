@@ -0,0 +1,129 @@
+import os
+import threading
+
+import pytest
+
+import toml
+
+from toml._cache import ParseCache
+
+
+def _write(tmpdir, name, data, mtime=None):
+    path = tmpdir.join(name)
+    path.write_binary(data.encode("utf8"))
+    if mtime is not None:
+        os.utime(str(path), ns=(mtime, mtime))
+    return str(path)
+
+
+def test_load_cached_reuses_result(tmpdir):
+    path = _write(tmpdir, "a.toml", "a = 1\n[b]\nc = [1, 2]\n")
+    cache = ParseCache()
+
+    first = cache.load(path)
+    second = cache.load(path)
+
+    assert first is second
+    assert first == {"a": 1, "b": {"c": (1, 2)}}
+    assert cache.info()[:5] == (1, 1, 0, 1, os.path.getsize(path))
+
+
+def test_load_cached_invalidates_on_change(tmpdir):
+    path = _write(tmpdir, "a.toml", "a = 1\n", mtime=1000000000)
+    cache = ParseCache()
+
+    assert cache.load(path) == {"a": 1}
+
+    # Same size, different modification time.
+    _write(tmpdir, "a.toml", "a = 2\n", mtime=2000000000)
+    assert cache.load(path) == {"a": 2}
+
+    # Same modification time, different size.
+    _write(tmpdir, "a.toml", "a = 30\n", mtime=2000000000)
+    assert cache.load(path) == {"a": 30}
+
+    info = cache.info()
+    assert (info.hits, info.misses, info.entries) == (0, 3, 1)
+    assert info.bytes == len("a = 30\n")
+
+
+def test_load_cached_is_immutable(tmpdir):
+    path = _write(tmpdir, "a.toml", "a = [[1], [2]]\n[b]\nc = 1\n")
+    value = ParseCache().load(path)
+
+    with pytest.raises(TypeError):
+        value["a"] = 1
+    with pytest.raises(TypeError):
+        value["b"]["c"] = 2
+    with pytest.raises(AttributeError):
+        value["a"][0].append(3)
+
+
+def test_load_cached_evicts_least_recently_used(tmpdir):
+    paths = [_write(tmpdir, "{}.toml".format(i), "a = 1\n") for i in range(3)]
+    cache = ParseCache(max_entries=2)
+
+    a = cache.load(paths[0])
+    cache.load(paths[1])
+    assert cache.load(paths[0]) is a
+    cache.load(paths[2])
+
+    assert cache.load(paths[0]) is a
+    assert cache.info().evictions == 1
+    assert cache.info().misses == 3
+    cache.load(paths[1])
+    assert cache.info().misses == 4
+
+
+def test_load_cached_byte_budget(tmpdir):
+    small = _write(tmpdir, "small.toml", "a = 1\n")
+    large = _write(tmpdir, "large.toml", "a = 1\n" + "\n" * 20)
+    cache = ParseCache(max_bytes=20)
+
+    cache.load(small)
+    cache.load(large)
+    cache.load(small)
+
+    info = cache.info()
+    assert (info.hits, info.misses, info.entries) == (1, 2, 1)
+    assert info.bytes == 6
+
+
+def test_load_cached_threads(tmpdir):
+    paths = [
+        _write(tmpdir, "{}.toml".format(i), "a = {}\n".format(i))
+        for i in range(8)
+    ]
+    cache = ParseCache(max_entries=4)
+    errors = []
+
+    def worker():
+        try:
+            for _ in range(20):
+                for i, path in enumerate(paths):
+                    assert cache.load(path) == {"a": i}
+        except Exception as exc:
+            errors.append(exc)
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    info = cache.info()
+    assert not errors
+    assert info.hits + info.misses == 8 * 20 * 8
+    assert info.entries <= 4
+
+
+def test_toml_load_cached(tmpdir):
+    path = _write(tmpdir, "a.toml", "a = 1\n")
+    toml.load_cached.cache_clear()
+
+    assert toml.load_cached(path) == {"a": 1}
+    assert toml.load_cached(path) == {"a": 1}
+    assert toml.load_cached.cache_info().hits == 1
+
+    toml.load_cached.cache_clear()
+    assert toml.load_cached.cache_info().entries == 0
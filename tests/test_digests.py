@@ -0,0 +1,86 @@
+import pytest
+import rply
+
+import toml
+
+
+_OLD = """a = 1
+
+[server]
+port = 80
+
+[server.tls]
+cert = "a"
+
+[db]
+url = "x"
+"""
+
+
+def test_table_digests():
+    digests = toml.table_digests(_OLD)
+
+    assert set(digests) == {(), ("server",), ("server", "tls"), ("db",)}
+    assert digests == toml.table_digests(_OLD.encode("utf8"))
+    assert len(set(digests.values())) == 4
+
+
+@pytest.mark.parametrize(
+    ("data", "exception"),
+    [
+        ("[a]\n[a]\n", ValueError),
+        ("[a]\n[b b]\n", rply.ParsingError),
+    ],
+)
+def test_table_digests_invalid(data, exception):
+    with pytest.raises(exception):
+        toml.table_digests(data)
+
+
+@pytest.mark.parametrize(
+    ("new", "expected"),
+    [
+        (_OLD, toml.TableDiff(set(), set(), set())),
+        (
+            _OLD.replace("port = 80", "port = 81"),
+            toml.TableDiff(set(), set(), {("server",)}),
+        ),
+        (
+            _OLD.replace("a = 1", "a = 2"),
+            toml.TableDiff(set(), set(), {()}),
+        ),
+        (
+            _OLD.replace("[db]", "[cache]"),
+            toml.TableDiff({("cache",)}, {("db",)}, set()),
+        ),
+        (
+            _OLD + "\n[extra]\n",
+            toml.TableDiff({("extra",)}, set(), set()),
+        ),
+        (
+            _OLD + "\n# The cache.\n\n[cache]\n",
+            toml.TableDiff({("cache",)}, set(), set()),
+        ),
+        (
+            _OLD.replace("[server.tls]", "# TLS\n[server.tls]"),
+            toml.TableDiff(set(), set(), set()),
+        ),
+        (
+            _OLD.replace('cert = "a"\n', 'cert = "a" # b\n'),
+            toml.TableDiff(set(), set(), {("server", "tls")}),
+        ),
+    ],
+)
+def test_diff_tables(new, expected):
+    assert toml.diff_tables(_OLD, new) == expected
+    assert toml.diff_tables(toml.table_digests(_OLD), new) == expected
+
+
+def test_diff_tables_reload():
+    # Only the tables that changed need to be loaded again.
+    new = _OLD.replace('cert = "a"', 'cert = "b"')
+    diff = toml.diff_tables(_OLD, new)
+
+    assert toml.loads(new, only=diff.changed) == {
+        "server": {"tls": {"cert": "b"}},
+    }
@@ -0,0 +1,268 @@
+import random
+
+import pytest
+
+import toml
+
+from toml import _incremental
+
+
+DATA = (
+    "# preamble\n"
+    "a = 1\n"
+    "b = [1, 2]\n"
+    "\n"
+    "[t]\n"
+    "c = \"x\"\n"
+    "[t.u] # comment\n"
+    "d = true\n"
+    "\n"
+    "[v]\n"
+    "e = 2\n"
+)
+
+
+def _loads(data):
+    try:
+        return toml.loads(data)
+    except Exception as exc:
+        return type(exc)
+
+
+def _compile(document):
+    try:
+        return document.compile()
+    except Exception as exc:
+        return type(exc)
+
+
+@pytest.mark.parametrize(
+    ("offset", "deleted", "inserted"),
+    [
+        # Editing a value inside of a single section.
+        (DATA.index("c = ") + 5, 3, '"yz"'),
+        # Adding a key to the preamble.
+        (0, 0, "z = 3\n"),
+        # Adding a new table in the middle of another one.
+        (DATA.index("d = "), 0, "[w]\n"),
+        # Removing a table header, merging its keys into the previous table.
+        (DATA.index("[v]"), 4, ""),
+        # Removing the newline between two sections.
+        (DATA.index("[t.u]") - 1, 1, ""),
+        # Removing the first table header, moving its keys into the preamble.
+        (DATA.index("[t]"), 4, ""),
+        # Appending to the end of the document.
+        (len(DATA), 0, "f = 3\n"),
+        # Replacing everything.
+        (0, len(DATA), "x = 1\n"),
+        # Making the document invalid.
+        (DATA.index("e = "), 0, "= "),
+        # Making the document semantically invalid.
+        (len(DATA), 0, "[t]\n"),
+    ],
+)
+def test_edit(offset, deleted, inserted):
+    document = toml.parse(DATA)
+    document.edit(offset, deleted, inserted)
+
+    expected = DATA[:offset] + inserted + DATA[offset + deleted:]
+    assert document.text == expected
+    assert document.render() == expected
+    assert _compile(document) == _loads(expected)
+
+
+def test_edit_recovers_from_errors():
+    document = toml.parse(DATA)
+
+    document.edit(DATA.index("e = 2") + 4, 1, "")
+    assert isinstance(document.error, Exception)
+    with pytest.raises(type(document.error)):
+        document.compile()
+
+    document.edit(DATA.index("e = 2") + 4, 0, "3")
+    assert document.error is None
+    assert document.compile()["v"] == {"e": 3}
+
+
+def test_edit_outside_of_document():
+    document = toml.parse(DATA)
+    with pytest.raises(ValueError):
+        document.edit(len(DATA), 1, "")
+    assert document.text == DATA
+
+
+def test_edit_only_recompiles_changed_sections(monkeypatch):
+    document = toml.parse(DATA)
+    document.compile()
+
+    compiled = []
+    original = _incremental.Section.compile
+
+    def compile(self):
+        if self._compiled is None:
+            compiled.append(self.nodes[0].render())
+        return original(self)
+
+    monkeypatch.setattr(_incremental.Section, "compile", compile)
+
+    document.edit(DATA.index("d = true") + 4, 4, "false")
+    assert document.compile()["t"]["u"] == {"d": False}
+    assert compiled == ["[t.u] # comment\nd = false\n\n"]
+
+
+def test_edit_randomized():
+    rng = random.Random(1234)
+    pieces = ["a", "1", " ", "=", "\n", "[", "]", ".", "#", '"', "b = 2\n",
+              "[x]\n", "[x.y]\n", "\n"]
+
+    document = toml.parse(DATA)
+    text = DATA
+    for _ in range(1000):
+        offset = rng.randint(0, len(text))
+        deleted = rng.randint(0, min(3, len(text) - offset))
+        inserted = "".join(
+            rng.choice(pieces) for _ in range(rng.randint(0, 2))
+        )
+        edits = [(offset, deleted, inserted)]
+
+        # Most random edits leave the document invalid, so we undo those to
+        # keep exercising edits on a valid document.
+        new = text[:offset] + inserted + text[offset + deleted:]
+        if isinstance(_loads(new), type):
+            edits.append(
+                (offset, len(inserted), text[offset:offset + deleted]),
+            )
+
+        for offset, deleted, inserted in edits:
+            document.edit(offset, deleted, inserted)
+            text = text[:offset] + inserted + text[offset + deleted:]
+
+            assert document.render() == text
+
+            # When a document has both a syntax error and a duplicate key,
+            # which one gets reported first depends on how it was parsed.
+            expected, result = _loads(text), _compile(document)
+            if isinstance(expected, type):
+                assert isinstance(result, type)
+            else:
+                assert result == expected
+
+
+def test_set_existing_key_keeps_formatting():
+    document = toml.parse("a  =  1   # comment\n[t]\nb = 2\n")
+
+    document.set(("a",), [1, "x"])
+    document.set(("t", "b"), True)
+
+    assert document.text == 'a  =  [1, "x"]   # comment\n[t]\nb = true\n'
+    assert document.compile() == {"a": [1, "x"], "t": {"b": True}}
+
+
+def test_set_new_keys_and_tables():
+    document = toml.parse("# header\n\n[t]\n\nb = 2\n\n[u]\n")
+
+    document.set(("a",), 1)
+    document.set(("t", "c"), 3)
+    document.set(("u", "d"), 4)
+    document.set(("v", "w", "e"), 5)
+
+    assert document.text == (
+        "# header\n\na = 1\n[t]\n\nb = 2\nc = 3\n\n[u]\nd = 4\n\n"
+        "[v.w]\ne = 5\n"
+    )
+    assert document.compile() == toml.loads(document.text)
+
+
+def test_delete():
+    document = toml.parse("a = 1 # gone\nb = 2\n[t]\nc = 3\n[t.u]\nd = 4\n")
+
+    document.delete(("a",))
+    document.delete(("t",))
+    document.delete(("t", "u", "d"))
+
+    assert document.text == "b = 2\n[t.u]\n"
+    assert document.compile() == {"b": 2, "t": {"u": {}}}
+
+    for path in [("a",), ("t",), ("t", "c"), ("x", "y"), ()]:
+        with pytest.raises(KeyError):
+            document.delete(path)
+
+
+def test_add_table():
+    document = toml.parse("a = 1\n")
+
+    document.add_table(("t",))
+
+    assert document.text == "a = 1\n\n[t]\n"
+    with pytest.raises(ValueError):
+        document.add_table(("t",))
+
+
+@pytest.mark.parametrize(
+    ("path", "value", "exception"),
+    [
+        (("t",), 1, ValueError),
+        (("t", "u"), 1, ValueError),
+        ((), 1, ValueError),
+        (("a",), object(), NotImplementedError),
+        (("a b",), 1, NotImplementedError),
+        (("n", "x"), object(), NotImplementedError),
+        (("n", "x y"), 1, NotImplementedError),
+        (("a", "x"), 1, ValueError),
+        (("a", "b", "x"), 1, ValueError),
+    ],
+)
+def test_set_errors(path, value, exception):
+    document = toml.parse("a = 1\n\n[t.u.v]\n")
+
+    with pytest.raises(exception):
+        document.set(path, value)
+    assert document.text == "a = 1\n\n[t.u.v]\n"
+    assert document.render() == document.text
+    assert document.compile() == toml.loads(document.text)
+
+
+@pytest.mark.parametrize("name", [("a",), ("a", "b"), ("t", "u", "v")])
+def test_add_table_errors(name):
+    document = toml.parse("a = 1\n[t.u.v]\n")
+
+    with pytest.raises(ValueError):
+        document.add_table(name)
+    assert document.text == document.render() == "a = 1\n[t.u.v]\n"
+    assert document.compile() == toml.loads(document.text)
+
+
+def test_structural_and_text_edits():
+    document = toml.parse(DATA)
+
+    document.set(("t", "u", "d"), False)
+    document.edit(0, 0, "z = 1\n")
+    document.set(("v", "e"), 3)
+    document.edit(len(document.text), 0, "f = 4\n")
+
+    assert document.render() == document.text
+    assert document.compile() == toml.loads(document.text)
+    assert document.compile()["v"] == {"e": 3, "f": 4}
+
+
+def test_set_only_renders_changed_path():
+    document = toml.parse(DATA)
+    tables = [n for n in document.document.children if n.children]
+    untouched = [t for t in tables if t.render() != "[v]\ne = 2\n"]
+
+    document.set(("v", "e"), 3)
+
+    assert all(t._rendered is not None for t in untouched)
+    assert document.text == DATA.replace("e = 2", "e = 3")
+
+
+def test_set_array_types():
+    import array
+
+    document = toml.parse("a = 1\n")
+
+    document.set(("a",), (1, 2))
+    document.set(("b",), array.array("q", [3]))
+
+    assert document.text == "a = [1, 2]\nb = [3]\n"
+    assert document.compile() == {"a": [1, 2], "b": [3]}
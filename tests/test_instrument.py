@@ -0,0 +1,126 @@
+import io
+import threading
+
+import toml
+
+
+def test_instrument_loads():
+    data = "a = 1 # comment\n[b]\nc = [1, 2]\n"
+
+    with toml.instrument() as stats:
+        assert toml.loads(data) == {"a": 1, "b": {"c": [1, 2]}}
+        assert toml.loads(data.encode("utf8")) == {"a": 1, "b": {"c": [1, 2]}}
+
+    assert stats.calls == 2
+    assert stats.bytes_in == 2 * len(data)
+    assert stats.tokens["INTEGER"] == 6
+    assert stats.tokens["COMMENT"] == 2
+    assert stats.tokens["LINE_END"] == 6
+    assert set(stats.times) == {"lex", "parse"}
+    assert all(t > 0 for t in stats.times.values())
+
+
+def test_instrument_load():
+    data = "a = \"é\"\n"
+
+    with toml.instrument() as stats:
+        toml.load(io.BytesIO(data.encode("utf8")))
+
+    assert stats.calls == 1
+    assert stats.bytes_in == len(data.encode("utf8"))
+    assert sum(stats.tokens.values()) == 6
+
+
+def test_instrument_lazy():
+    with toml.instrument() as stats:
+        toml.loads("[a]\nb = 1\n", lazy=True)
+
+    assert stats.calls == 1
+    assert set(stats.times) == {"scan"}
+
+
+def test_instrument_only():
+    with toml.instrument() as stats:
+        toml.loads("a = 1\n[b]\nc = 2\n[d]\ne = 3\n", only=["b"])
+
+    assert stats.calls == 1
+    assert stats.tokens["INTEGER"] == 2
+    assert set(stats.times) == {"scan", "lex", "parse"}
+
+
+def _count(node):
+    return 1 + sum(_count(child) for child in node.children)
+
+
+def test_instrument_parse():
+    data = "a = 1 # comment\n[b]\nc = [1, 2]\n"
+
+    with toml.instrument() as stats:
+        document = toml.parse(data)
+        small = toml.parse("a = 1\n")
+
+    assert stats.calls == 2
+    assert stats.bytes_in == len(data) + len("a = 1\n")
+    assert stats.nodes == _count(document.document) + _count(small.document)
+    assert stats.peak_nodes == _count(document.document)
+    assert set(stats.times) == {"lex", "parse"}
+
+
+def test_instrument_edit():
+    document = toml.parse("a = 1\n[b]\nc = 2\n")
+
+    with toml.instrument() as stats:
+        document.edit(4, 1, "2")
+
+    # Only the section before the first table gets parsed again.
+    assert stats.calls == 0
+    assert stats.nodes == stats.peak_nodes == 8
+
+
+def test_instrument_loads_builds_no_nodes():
+    with toml.instrument() as stats:
+        toml.loads("a = 1\n")
+
+    assert stats.nodes == stats.peak_nodes == 0
+
+
+def test_instrument_dumps():
+    with toml.instrument() as stats:
+        assert toml.dumps({"a": "é"}) == 'a = "é"\n'
+        toml.dump({"a": "é"}, io.BytesIO())
+        toml.dump({"a": "é"}, io.StringIO())
+
+    assert stats.calls == 3
+    assert stats.bytes_out == 3 * len('a = "é"\n'.encode("utf8"))
+    assert set(stats.times) == {"dump"}
+
+
+def test_instrument_callback():
+    collected = []
+
+    with toml.instrument(collected.append) as stats:
+        toml.loads("a = 1\n")
+
+    assert collected == [stats]
+    assert stats.calls == 1
+
+
+def test_instrument_is_thread_local():
+    def other():
+        toml.loads("a = 1\n")
+
+    with toml.instrument() as stats:
+        thread = threading.Thread(target=other)
+        thread.start()
+        thread.join()
+
+    assert stats.calls == 0
+
+
+def test_instrument_disabled_afterwards():
+    with toml.instrument() as stats:
+        pass
+    toml.loads("a = 1\n")
+
+    assert stats.calls == 0
+    assert toml._instrument.active() is None
@@ -1,9 +1,11 @@
 import ast
+import io
 import os
 import os.path
 import shlex
 
 import pytest
+import rply
 
 from rply.token import Token
 
@@ -34,3 +36,124 @@ def _load_lexer_fixtures():
 def test_lexer_lexes(name, inp, expected):
     results = list(lexer.lex(inp))
     assert results == expected
+
+
+@pytest.mark.parametrize(("name", "inp", "expected"), _load_lexer_fixtures())
+def test_lexer_source_positions(name, inp, expected):
+    lg = rply.LexerGenerator()
+    for token_name, pattern in lexer._rules:
+        lg.add(token_name, pattern)
+
+    def positions(tokens):
+        return [
+            (t.source_pos.idx, t.source_pos.lineno, t.source_pos.colno)
+            for t in tokens
+        ]
+
+    assert positions(lexer.lex(inp)) == positions(lg.build().lex(inp))
+
+
+@pytest.mark.parametrize(("name", "inp", "expected"), _load_lexer_fixtures())
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 64])
+@pytest.mark.parametrize("binary", [True, False])
+def test_lex_file(name, inp, expected, chunk_size, binary):
+    fp = io.BytesIO(inp.encode("utf8")) if binary else io.StringIO(inp)
+
+    def positions(tokens):
+        return [
+            (t.name, t.value, t.source_pos.idx, t.source_pos.lineno,
+             t.source_pos.colno)
+            for t in tokens
+        ]
+
+    assert (positions(lexer.lex_file(fp, chunk_size=chunk_size))
+            == positions(lexer.lex(inp)))
+
+
+@pytest.mark.parametrize(("name", "inp", "expected"), _load_lexer_fixtures())
+def test_lex_integer_arrays_covers_input(name, inp, expected):
+    tokens = list(lexer.lex(inp, integer_arrays=True))
+    assert "".join(t.value for t in tokens) == inp
+
+
+@pytest.mark.parametrize(
+    ("inp", "expected"),
+    [
+        ("a = [1, -2, +3_0]\n", ["[1, -2, +3_0]"]),
+        ("a = [ 1 ,2 ]\n", ["[ 1 ,2 ]"]),
+        ("a = [[1], [2, 3]]\n", ["[1]", "[2, 3]"]),
+        ("a = [1, 'x']\n", []),
+        ("a = []\n", []),
+        ("a = [01]\n", []),
+        ("[1]\n", []),
+        ("  [1]\n", []),
+    ],
+)
+def test_lex_integer_arrays(inp, expected):
+    tokens = list(lexer.lex(inp, integer_arrays=True))
+    assert [t.value for t in tokens if t.name == "INTEGER_ARRAY"] == expected
+    assert "".join(t.value for t in tokens) == inp
+
+
+@pytest.mark.parametrize(("name", "inp", "expected"), _load_lexer_fixtures())
+@pytest.mark.parametrize("kind", [bytes, bytearray, memoryview])
+def test_lex_bytes(name, inp, expected, kind):
+    encoded = inp.encode("utf8")
+
+    def positions(tokens, offset):
+        return [
+            (t.name, t.value, offset(t.source_pos.idx), t.source_pos.lineno)
+            for t in tokens
+        ]
+
+    # Source positions from bytes are byte offsets, rather than characters.
+    assert (
+        positions(lexer.lex_bytes(kind(encoded)), lambda idx: idx)
+        == positions(
+            lexer.lex(inp), lambda idx: len(inp[:idx].encode("utf8")),
+        )
+    )
+
+
+def test_lex_bytes_start():
+    inp = 'a = "é"\nb = 1\n'.encode("utf8")
+
+    tokens = list(lexer.lex_bytes(inp, inp.index(b"b")))
+
+    assert tokens[0].value == "b"
+    assert tokens[0].source_pos.idx == 9
+    assert tokens[0].source_pos.lineno == 2
+    assert tokens[0].source_pos.colno == 1
+
+
+@pytest.mark.parametrize(
+    ("inp", "start"),
+    [
+        (b'a = "\xff"\n', 5),
+        (b"# \xc3\n", 2),
+        (b'a = """\n\xe9"""\n', 8),
+    ],
+)
+def test_lex_bytes_invalid_utf8(inp, start):
+    with pytest.raises(UnicodeDecodeError) as excinfo:
+        list(lexer.lex_bytes(memoryview(inp)))
+    assert excinfo.value.start == start
+
+
+@pytest.mark.parametrize(
+    ("inp", "start"),
+    [
+        (b"a = 1\n" * 20 + b'b = "\xff"\n', 125),
+        # The second byte of the character falls in the next chunk.
+        (b"a = 1\n" * 20 + b'b = "\xc3\xa9\xc3\xff"\n', 127),
+        (b"a = 1\n" * 20 + b"# \xc3\n", 122),
+    ],
+)
+@pytest.mark.parametrize("chunk_size", [1, 7, 64 * 1024])
+def test_lex_file_invalid_utf8(inp, start, chunk_size):
+    with pytest.raises(UnicodeDecodeError) as excinfo:
+        list(lexer.lex_file(io.BytesIO(inp), chunk_size=chunk_size))
+    assert excinfo.value.start == start
+    with pytest.raises(UnicodeDecodeError) as excinfo:
+        list(lexer.lex_bytes(inp))
+    assert excinfo.value.start == start
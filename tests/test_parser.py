@@ -0,0 +1,137 @@
+import json
+import os
+
+import pytest
+import rply.parsergenerator
+
+from toml import _lexer as lexer, _parser as parser
+from toml._nodes import ValueStatement
+
+
+class FakeAppDirs(object):
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+
+    def __call__(self, appname):
+        return self
+
+    @property
+    def user_cache_dir(self):
+        return self.cache_dir
+
+
+def test_parser_tables_are_cached(monkeypatch, tmpdir):
+    monkeypatch.setattr(
+        rply.parsergenerator, "AppDirs", FakeAppDirs(str(tmpdir)),
+    )
+
+    parser._build_parser(parser._pg)
+
+    cached = os.listdir(str(tmpdir))
+    assert len(cached) == 1
+    assert cached[0].startswith("toml-")
+
+
+def test_parser_regenerates_corrupt_cache(monkeypatch, tmpdir):
+    monkeypatch.setattr(
+        rply.parsergenerator, "AppDirs", FakeAppDirs(str(tmpdir)),
+    )
+
+    parser._build_parser(parser._pg)
+    cache_file, = os.listdir(str(tmpdir))
+    tmpdir.join(cache_file).write("{not json")
+
+    # Tables that another version of our grammar has cached are left alone.
+    other = "toml-{}-other.json".format(parser._pg.VERSION)
+    tmpdir.join(other).write("{}")
+
+    p = parser._build_parser(parser._pg)
+
+    assert parser._pg.cache_id == "toml"
+    assert sorted(os.listdir(str(tmpdir))) == sorted([cache_file, other])
+    assert tmpdir.join(other).read() == "{}"
+    assert json.loads(tmpdir.join(cache_file).read())
+    assert p.parse(
+        lexer.attach_trivia(lexer.lex("a = 1\n")), state=parser.ParserState(),
+    )
+
+
+def test_parser_without_writable_cache(monkeypatch, tmpdir):
+    cache_dir = tmpdir.join("file")
+    cache_dir.write("")
+    monkeypatch.setattr(
+        rply.parsergenerator, "AppDirs", FakeAppDirs(str(cache_dir)),
+    )
+
+    # The tables should only be generated once, even though they can't be
+    # written to the cache.
+    generated = []
+    from_grammar = rply.parsergenerator.LRTable.from_grammar
+    monkeypatch.setattr(
+        rply.parsergenerator.LRTable, "from_grammar",
+        lambda grammar: generated.append(grammar) or from_grammar(grammar),
+    )
+
+    p = parser._build_parser(parser._pg)
+
+    assert len(generated) == 1
+
+    assert p.parse(
+        lexer.attach_trivia(lexer.lex("a = 1\n")), state=parser.ParserState(),
+    )
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        "a = 1\n",
+        "  a = 1\n",
+        "\t\ta\t=\t1\t\t# comment\n",
+        "# comment\n\n   \n",
+        "a = [ 1 , [2, 3 ], [] ]  \n",
+        " [ a . b ] # comment\n c = \"x\"\n\n[d]\r\n",
+    ],
+)
+def test_parse_renders_identically(data):
+    assert parser.parse(lexer.lex(data)).render() == data
+
+
+def test_parse_many_statements():
+    # Statements used to be accumulated by copying the list of every prior
+    # statement on each reduction, which made parsing quadratic in the number
+    # of lines in the document, this should take seconds rather than minutes.
+    lines = []
+    for i in range(100):
+        lines.append("[table{}]".format(i))
+        for j in range(999):
+            lines.append("key{} = {}".format(j, j) if j % 3 else "")
+    data = "\n".join(lines) + "\n"
+
+    document = parser.parse(lexer.lex(data))
+
+    assert len(lines) == 100000
+    assert len(document.children) == 100
+    assert all(
+        len([n for n in table.children if isinstance(n, ValueStatement)])
+        == 666
+        for table in document.children
+    )
+    assert document.render() == data
+
+
+def test_render_is_invalidated_by_changes():
+    document = parser.parse(lexer.lex("a = 1\n[t]\nb = 2\n"))
+    table = document.children[-1]
+    statement = table.children[-2]
+
+    assert document.render() == "a = 1\n[t]\nb = 2\n"
+
+    statement.children[-1].content = "3"
+    assert document.render() == "a = 1\n[t]\nb = 3\n"
+
+    statement.parent = None
+    assert document.render() == "a = 1\n[t]\n\n"
+
+    statement.parent = document
+    assert document.render() == "a = 1\n[t]\n\nb = 3"
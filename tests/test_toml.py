@@ -0,0 +1,649 @@
+import codecs
+import datetime
+import io
+import mmap
+import os
+import os.path
+import sys
+import tempfile
+
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+
+import pytest
+import rply
+
+import toml
+
+from toml import _lexer, _parser
+
+
+def _documents():
+    # Our lexer fixtures make a handy corpus of documents, some of which we
+    # can parse and some of which we can't.
+    fixture_dir = os.path.join(os.path.dirname(__file__), "data", "lexer")
+    for fixture in sorted(os.listdir(fixture_dir)):
+        path = os.path.join(fixture_dir, fixture)
+        with open(path, "r", encoding="utf8") as fp:
+            yield fp.read().split("\n---\n")[0]
+
+    yield "  a = 1 # comment\n\n[ a . b ]\nc = [ 1, [2, 3 ], [] ]\n"
+    yield "a = 1\na = 2\n"
+    yield "[a]\n[a]\n"
+    yield "+1 = 2\n"
+
+
+@pytest.mark.parametrize(
+    ("data", "expected"),
+    [
+        ("a = 1\n", {"a": 1}),
+        ("a = 1\nb = 2\n", {"a": 1, "b": 2}),
+        ("[a]\nb = 1\n[c]\nd = 2\n", {"a": {"b": 1}, "c": {"d": 2}}),
+        ("[a.b]\nc = 1\n[a]\nd = 2\n", {"a": {"b": {"c": 1}, "d": 2}}),
+        ("[a]\n[a.b]\nc = 1\n", {"a": {"b": {"c": 1}}}),
+        ("a = [1, [2, 3]]\n", {"a": [1, [2, 3]]}),
+    ],
+)
+def test_loads(data, expected):
+    assert toml.loads(data) == expected
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        "a = 1\na = 2\n",
+        "[a]\nb = 1\nb = 2\n",
+        "[a]\n[a]\n",
+        "[a.b]\n[a]\n[a.b]\n",
+        "a = 1\n[a]\n",
+        "a = [1]\n[a.b]\n",
+        "[a]\nb = 1\n[a.b]\n",
+        "[a.b]\n[a]\nb = 1\n",
+    ],
+)
+def test_loads_duplicate_keys(data):
+    with pytest.raises(ValueError):
+        toml.loads(data)
+
+
+@pytest.mark.parametrize("data", list(_documents()))
+def test_loads_matches_fst(data):
+    try:
+        expected = _parser.parse(_lexer.lex(data)).compile()
+    except Exception as exc:
+        with pytest.raises(type(exc)):
+            toml.loads(data)
+    else:
+        assert toml.loads(data) == expected
+
+
+def _to_dict(value):
+    if isinstance(value, Mapping):
+        return {k: _to_dict(v) for k, v in value.items()}
+    return value
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        "a = 1\n",
+        "\n[a]\nb = 1\n",
+        "a = 1\n[x.y]\nb = 2\n[x]\nc = [1]\n  [z] # [w]\nd = \"[q]\"\n",
+        "[a]\n'[b]' = \"[c]\"\n",
+    ],
+)
+def test_loads_lazy(data):
+    assert _to_dict(toml.loads(data, lazy=True)) == toml.loads(data)
+
+
+def test_loads_lazy_only_compiles_accessed_tables():
+    data = "[good]\na = 1\n[bad]\nb = = 2\n"
+
+    loaded = toml.loads(data, lazy=True)
+
+    assert loaded["good"]["a"] == 1
+    with pytest.raises(rply.ParsingError) as excinfo:
+        loaded["bad"]["b"]
+    assert excinfo.value.getsourcepos().lineno == 4
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        "[a]\n[a]\n",
+        "[a.b]\n[a]\n[a.b]\n",
+    ],
+)
+def test_loads_lazy_duplicate_tables(data):
+    with pytest.raises(ValueError):
+        toml.loads(data, lazy=True)
+
+
+@pytest.mark.parametrize(
+    ("data", "path"),
+    [
+        ("a = 1\n[a]\n", ["a"]),
+        ("[a]\nb = 1\n[a.b]\n", ["a", "b"]),
+        ("[a.b]\n[a]\nb = 1\n", ["a", "b"]),
+    ],
+)
+def test_loads_lazy_conflicting_keys(data, path):
+    loaded = toml.loads(data, lazy=True)
+    with pytest.raises(ValueError):
+        for part in path:
+            loaded = loaded[part]
+
+
+@pytest.mark.parametrize("data", list(_documents()))
+def test_load_matches_loads(data):
+    try:
+        expected = toml.loads(data)
+    except Exception as exc:
+        with pytest.raises(type(exc)):
+            toml.load(io.BytesIO(data.encode("utf8")))
+    else:
+        assert toml.load(io.BytesIO(data.encode("utf8"))) == expected
+        assert toml.load(io.StringIO(data)) == expected
+
+
+def test_load_mmap(tmpdir):
+    path = tmpdir.join("test.toml")
+    path.write_binary(b"a = 1\n[b]\nc = \"\xc3\xa9\"\n")
+
+    with path.open("rb") as fp:
+        with mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            assert toml.load(mapped) == {"a": 1, "b": {"c": "\u00e9"}}
+
+
+def test_load_invalid_utf8():
+    with pytest.raises(UnicodeDecodeError):
+        toml.load(io.BytesIO(b"a = \"\xc3\"\n"))
+
+
+@pytest.mark.parametrize("data", list(_documents()))
+def test_validate_matches_loads(data):
+    try:
+        toml.loads(data)
+    except (rply.LexingError, rply.ParsingError) as exc:
+        error = toml.validate(data)
+        assert error is not None
+        if exc.getsourcepos() is not None:
+            assert error.offset == exc.getsourcepos().idx
+            assert error.line == exc.getsourcepos().lineno
+            assert error.column == exc.getsourcepos().colno
+    except ValueError:
+        # Semantic errors, like duplicate keys, aren't syntax errors.
+        assert toml.validate(data) is None
+    else:
+        assert toml.validate(data) is None
+
+
+@pytest.mark.parametrize(
+    ("data", "expected"),
+    [
+        ("a = 1\nb = @\n", ("Unexpected character '@'", 2, 5, 10)),
+        ("a = 1\nb = \n", ("Unexpected LINE_END '\\n'", 2, 5, 10)),
+        ("a = 1\n[b", ("Unexpected end of document", 2, 3, 8)),
+        ("+1 = 2\n", ("Unexpected INTEGER '+1'", 1, 1, 0)),
+        (b"a = 1\n# \xff\n", ("Invalid UTF8: invalid start byte", 2, 3, 8)),
+    ],
+)
+def test_validate_errors(data, expected):
+    assert toml.validate(data) == expected
+
+
+@pytest.mark.parametrize("data", list(_documents()) + [
+    'a = "\u00e9"\nb = @\n',
+    '# \u2603\n\u00e9 = 1\n',
+    '[\u00e9]\n"\u2603" = 1\n[b',
+    'a = "\u2603"\nb = \n',
+])
+def test_validate_bytes_matches_text(data):
+    expected = toml.validate(data)
+    assert toml.validate(data.encode("utf8")) == expected
+    assert toml.validate(memoryview(data.encode("utf8"))) == expected
+
+
+@pytest.mark.parametrize(
+    ("data", "expected"),
+    [
+        (b"a = 1\n\xff = 2\n", ("Invalid UTF8: invalid start byte", 2, 1, 6)),
+        (b"a = 1\n\xc3", ("Invalid UTF8: unexpected end of data", 2, 1, 6)),
+        (
+            b'a = "\xc3\xa9\xff"\n',
+            ("Invalid UTF8: invalid start byte", 1, 7, 6),
+        ),
+    ],
+)
+def test_validate_invalid_utf8(data, expected):
+    assert toml.validate(data) == expected
+    assert toml.validate(memoryview(data)) == expected
+
+
+def test_memoryview_documents():
+    data = memoryview('a = "\u00e9"\n[t]\nb = 1\n'.encode("utf8"))
+    expected = {"a": "\u00e9", "t": {"b": 1}}
+
+    assert toml.parse(data).compile() == expected
+    assert toml.loads_with_locations(data)[0] == expected
+
+
+@pytest.mark.parametrize("data", list(_documents()))
+def test_loads_with_locations_matches_loads(data):
+    try:
+        expected = toml.loads(data)
+    except Exception as exc:
+        with pytest.raises(type(exc)):
+            toml.loads_with_locations(data)
+    else:
+        assert toml.loads_with_locations(data)[0] == expected
+
+
+def test_loads_with_locations():
+    data = 'a = 1\n  "b" = [ 1, [2] ] # c\n\n [ t . u ]\nk = true\n'
+
+    value, locations = toml.loads_with_locations(data)
+
+    assert value == {"a": 1, "b": [1, [2]], "t": {"u": {"k": True}}}
+    assert locations == {
+        ("a",): (1, 1, 0, 5),
+        ("b",): (2, 3, 8, 24),
+        ("t", "u"): (4, 2, 31, 40),
+        ("t", "u", "k"): (5, 1, 41, 49),
+    }
+    assert [data[loc.start:loc.end] for loc in locations.values()] == [
+        "a = 1", '"b" = [ 1, [2] ]', "[ t . u ]", "k = true",
+    ]
+
+
+_DUMPS = [
+    ({}, ""),
+    ({"a": 1}, "a = 1\n"),
+    (
+        {"a": {"b": {"c": 1}, "d": 2}, "e": "x", "f": {}},
+        'e = "x"\n\n[a]\nd = 2\n\n[f]\n\n[a.b]\nc = 1\n',
+    ),
+    (
+        {"a": [1, [True, "x"], []], "b": False},
+        'a = [1, [true, "x"], []]\nb = false\n',
+    ),
+]
+
+
+@pytest.mark.parametrize(("data", "expected"), _DUMPS)
+def test_dumps(data, expected):
+    assert toml.dumps(data) == expected
+    if expected:
+        assert toml.loads(expected) == data
+
+
+@pytest.mark.parametrize(("data", "expected"), _DUMPS)
+@pytest.mark.parametrize("buffer_size", [1, 10, 64 * 1024])
+def test_dump(data, expected, buffer_size):
+    text, binary = io.StringIO(), io.BytesIO()
+
+    toml.dump(data, text, buffer_size=buffer_size)
+    toml.dump(data, binary, buffer_size=buffer_size)
+
+    assert text.getvalue() == expected
+    assert binary.getvalue() == expected.encode("utf8")
+    assert "".join(toml.iterdump(data)) == expected
+
+
+@pytest.mark.parametrize(
+    ("make", "read"),
+    [
+        (
+            lambda: tempfile.SpooledTemporaryFile(mode="w+"),
+            lambda fp: fp.read(),
+        ),
+        (
+            lambda: tempfile.SpooledTemporaryFile(mode="w+b"),
+            lambda fp: fp.read().decode("utf8"),
+        ),
+        (
+            lambda: codecs.getwriter("utf8")(io.BytesIO()),
+            lambda fp: fp.stream.read().decode("utf8"),
+        ),
+    ],
+)
+def test_dump_file_like(make, read):
+    data = {"a": "é", "t": {"b": 1}}
+
+    with make() as fp:
+        toml.dump(data, fp)
+        fp.seek(0)
+        assert read(fp) == toml.dumps(data)
+
+
+def test_dump_file(tmpdir):
+    data = {"t{}".format(i): {"k": i, "s": "é"} for i in range(1000)}
+
+    with open(str(tmpdir.join("out.toml")), "wb") as fp:
+        toml.dump(data, fp)
+    with open(str(tmpdir.join("out.toml")), "rb") as fp:
+        assert fp.read() == toml.dumps(data).encode("utf8")
+        fp.seek(0)
+        assert toml.load(fp) == data
+
+
+@pytest.mark.parametrize(
+    ("data", "exception"),
+    [
+        ({1: 2}, ValueError),
+        ({"a b": 1}, NotImplementedError),
+        ({"a": 1.5}, NotImplementedError),
+    ],
+)
+def test_dumps_errors(data, exception):
+    with pytest.raises(exception):
+        toml.dumps(data)
+
+
+def test_register_encoder():
+    import decimal
+    import enum
+
+    class Color(enum.Enum):
+        red = "red"
+
+    class Level(int):
+        pass
+
+    toml.register_encoder(decimal.Decimal, str)
+    toml.register_encoder(Color, lambda color: color.value)
+    try:
+        data = {
+            "a": decimal.Decimal("1.5"),
+            "b": [Color.red],
+            "c": Level(3),
+            "d": True,
+        }
+        assert toml.dumps(data) == 'a = "1.5"\nb = ["red"]\nc = 3\nd = true\n'
+    finally:
+        del toml._encoder._encoders[decimal.Decimal]
+        del toml._encoder._encoders[Color]
+        toml._encoder._dispatch.clear()
+
+    with pytest.raises(NotImplementedError):
+        toml.dumps({"a": decimal.Decimal("1.5")})
+
+
+def test_dumps_int_subclasses():
+    import enum
+
+    class Level(enum.IntEnum):
+        high = 3
+
+    class Quiet(int):
+        def __str__(self):
+            return "quiet"
+
+    data = {"a": Level.high, "b": [Quiet(2)]}
+    assert toml.dumps(data) == "a = 3\nb = [2]\n"
+    assert toml.loads(toml.dumps(data)) == data
+
+
+def test_dumps_array_types(tmpdir):
+    import array
+
+    data = "a = [1, -2]\nb = [[1], [\"x\", true]]\n\n[t]\nc = []\n"
+    path = tmpdir.join("a.toml")
+    path.write(data)
+    expected = toml.loads(data)
+
+    cached = toml.load_cached(str(path))
+    assert isinstance(cached["a"], tuple)
+    assert toml.dumps(cached) == toml.dumps(expected)
+
+    compact = toml.loads(data, array_type="array")
+    assert isinstance(compact["a"], array.array)
+    assert toml.dumps(compact) == toml.dumps(expected)
+    assert toml.loads(toml.dumps(compact)) == expected
+
+
+_SELECT = """name = "root"
+tool = 1
+
+[server]
+port = 80
+
+[server.tls]
+cert = "a"
+
+[other]
+x = [1, 2]
+
+[tool2.poetry]
+name = "x"
+deps = ["a"]
+
+[tool2.black]
+line = 79
+"""
+
+
+@pytest.mark.parametrize(
+    ("only", "expected"),
+    [
+        ([], {}),
+        (["server"], {"server": {"port": 80, "tls": {"cert": "a"}}}),
+        ("server.tls", {"server": {"tls": {"cert": "a"}}}),
+        ([("server", "port")], {"server": {"port": 80}}),
+        (["name", "missing", "server.missing"], {"name": "root"}),
+        (
+            ["tool2.poetry", "tool2"],
+            {
+                "tool2": {
+                    "poetry": {"name": "x", "deps": ["a"]},
+                    "black": {"line": 79},
+                },
+            },
+        ),
+        (["tool.poetry"], {}),
+    ],
+)
+def test_loads_only(only, expected):
+    assert toml.loads(_SELECT, only=only) == expected
+
+
+def test_loads_only_skips_unrelated_tables():
+    # Tables that aren't wanted are never parsed, so errors in them aren't
+    # found, but errors in the tables that are wanted still are.
+    data = _SELECT + "[broken]\nx = = 1\n[server]\n"
+
+    assert toml.loads(data, only=["other"]) == {"other": {"x": [1, 2]}}
+    with pytest.raises(ValueError):
+        toml.loads(data, only=["server"])
+
+
+def test_loads_only_root():
+    with pytest.raises(ValueError):
+        toml.loads(_SELECT, only=[()])
+
+
+def test_loads_only_lazy():
+    with pytest.raises(ValueError):
+        toml.loads(_SELECT, lazy=True, only=["server"])
+
+
+_ARRAYS = """a = [1, -2, 3_000]
+b = [[1, 2], [3]]
+c = [1, "x"]
+d = []
+e = 1
+
+[t]
+f = [9223372036854775807, -9223372036854775808]
+g = [9223372036854775808]
+"""
+
+
+def test_loads_array_type_array():
+    import array
+
+    data = toml.loads(_ARRAYS, array_type="array")
+
+    assert data == {
+        "a": array.array("q", [1, -2, 3000]),
+        "b": [array.array("q", [1, 2]), array.array("q", [3])],
+        "c": [1, "x"],
+        "d": [],
+        "e": 1,
+        "t": {
+            "f": array.array("q", [2 ** 63 - 1, -2 ** 63]),
+            "g": [2 ** 63],
+        },
+    }
+    assert toml.loads(_ARRAYS, array_type="array", only=["t"]) == {
+        "t": data["t"],
+    }
+
+
+def test_loads_array_type_numpy():
+    numpy = pytest.importorskip("numpy")
+
+    data = toml.loads(_ARRAYS, array_type="numpy")
+
+    assert isinstance(data["a"], numpy.ndarray)
+    assert data["a"].tolist() == [1, -2, 3000]
+    assert data["t"]["g"] == [2 ** 63]
+
+
+def test_loads_array_type_numpy_missing(monkeypatch):
+    monkeypatch.setitem(sys.modules, "numpy", None)
+
+    with pytest.raises(ImportError):
+        toml.loads("e = 1\n", array_type="numpy")
+
+
+@pytest.mark.parametrize(
+    ("kwargs", "exception"),
+    [
+        ({"array_type": "tuple"}, ValueError),
+        ({"array_type": "array", "lazy": True}, ValueError),
+    ],
+)
+def test_loads_array_type_invalid(kwargs, exception):
+    with pytest.raises(exception):
+        toml.loads(_ARRAYS, **kwargs)
+
+
+@pytest.mark.parametrize(
+    ("content", "expected"),
+    [
+        ('"plain"', "plain"),
+        (r'"a\tb\nc\"d\\e"', 'a\tb\nc"d\\e'),
+        (r'"é\U0001F600"', "é\U0001F600"),
+        (r'"\\u00e9"', "\\u00e9"),
+        (r'"\b\f\r"', "\b\f\r"),
+    ],
+)
+def test_loads_basic_string_escapes(content, expected):
+    assert toml.loads("a = {}\n".format(content)) == {"a": expected}
+
+
+@pytest.mark.parametrize("content", [r'"\uD800"', r'"\U00110000"'])
+def test_loads_basic_string_invalid_escapes(content):
+    with pytest.raises(ValueError):
+        toml.loads("a = {}\n".format(content))
+
+
+_UTC = datetime.timezone.utc
+
+
+@pytest.mark.parametrize(
+    ("content", "expected"),
+    [
+        (
+            "1979-05-27T07:32:00Z",
+            datetime.datetime(1979, 5, 27, 7, 32, tzinfo=_UTC),
+        ),
+        (
+            "1979-05-27T07:32:00+00:00",
+            datetime.datetime(1979, 5, 27, 7, 32, tzinfo=_UTC),
+        ),
+        (
+            "1979-05-27T00:32:00.999999-07:00",
+            datetime.datetime(
+                1979, 5, 27, 0, 32, 0, 999999,
+                tzinfo=datetime.timezone(datetime.timedelta(hours=-7)),
+            ),
+        ),
+        (
+            "1979-05-27T00:32:00.5+05:30",
+            datetime.datetime(
+                1979, 5, 27, 0, 32, 0, 500000,
+                tzinfo=datetime.timezone(
+                    datetime.timedelta(hours=5, minutes=30),
+                ),
+            ),
+        ),
+        (
+            "1979-05-27T00:32:00.1234567Z",
+            datetime.datetime(
+                1979, 5, 27, 0, 32, 0, 123456, tzinfo=datetime.timezone.utc,
+            ),
+        ),
+    ],
+)
+def test_loads_datetimes(content, expected):
+    value = toml.loads("a = {}\n".format(content))["a"]
+    assert value == expected
+    assert value.utcoffset() == expected.utcoffset()
+
+
+def test_loads_datetime_out_of_range():
+    with pytest.raises(ValueError):
+        toml.loads("a = 1979-13-27T07:32:00Z\n")
+
+
+def test_dumps_roundtrips_scalars():
+    data = {
+        "s": 'a"b\\c\nd\x01é',
+        "t": datetime.datetime(
+            2020, 1, 2, 3, 4, 5, 6, tzinfo=datetime.timezone.utc,
+        ),
+        "u": datetime.datetime(
+            2020, 1, 2, 3, 4, 5,
+            tzinfo=datetime.timezone(datetime.timedelta(hours=-7)),
+        ),
+    }
+    assert toml.loads(toml.dumps(data)) == data
+
+
+def test_loads_interns_keys():
+    data = toml.loads("[a]\nname = 1\n[b]\nname = 2\n[a.name2]\n[c.a]\n")
+
+    (a,), (b,) = [k for k in data["a"] if k == "name"], list(data["b"])
+    assert a is b
+    assert next(iter(data)) is next(iter(data["c"]))
+
+
+@pytest.mark.parametrize("kind", [bytes, bytearray, memoryview])
+def test_loads_binary(kind):
+    data = 'a = "é"\nb = [1, 2]\n[t]\nc = "\\u00e9"\n'
+    expected = toml.loads(data)
+
+    assert toml.loads(kind(data.encode("utf8"))) == expected
+    assert dict(toml.loads(kind(data.encode("utf8")), lazy=True)) == {
+        "a": "é", "b": [1, 2], "t": toml.loads(data)["t"],
+    }
+    assert toml.loads(kind(data.encode("utf8")), only=["t"]) == {
+        "t": expected["t"],
+    }
+
+
+def test_loads_binary_invalid_utf8():
+    with pytest.raises(UnicodeDecodeError) as excinfo:
+        toml.loads(b'a = 1\nb = "\xe9"\n')
+    assert excinfo.value.start == 11
+
+
+def test_load_invalid_utf8_past_first_chunk():
+    data = b"".join(b"a%d = 1\n" % i for i in range(30000)) + b"# \xff\n"
+    with pytest.raises(UnicodeDecodeError) as excinfo:
+        toml.load(io.BytesIO(data))
+    assert excinfo.value.start == len(data) - 2